@@ -3,6 +3,9 @@ Configuration file for TrendWise Demand Forecaster
 Contains all model parameters and settings for easy customization.
 """
 
+import functools
+import pickle
+
 # Model Configuration
 MODEL_CONFIG = {
     "model_name": "TrendWise Demand Forecaster",
@@ -67,7 +70,9 @@ PROPHET_CONFIG = {
         "changepoint_prior_scale": 0.05,
         "seasonality_prior_scale": 10,
         "holidays_prior_scale": 10,
-        "interval_width": 0.8
+        "interval_width": 0.8,
+        "uncertainty_samples": 100,  # Monte Carlo draws for yhat_lower/upper (Prophet default: 1000)
+        "stan_backend": "CMDSTANPY"  # Same as STAN_BACKEND=CMDSTANPY in the environment
     },
     "validation": {
         "test_periods": 30,  # days
@@ -93,17 +98,25 @@ FALLBACK_MODELS_CONFIG = {
     },
     "naive_config": {
         "method": "last_value"  # Use last observed value
-    }
+    },
+    "jit": True  # Compile SES kernels with Numba when it is installed
 }
 
 # Model Selection Logic
 MODEL_SELECTION_CONFIG = {
     "logic": [
+        "Short series (< prophet_min_points) skip Prophet and use fallbacks only",
+        "With more than prophet_max_skus eligible SKUs, only the highest-volume ones try Prophet",
+        "Nearly constant series (std < prophet_min_std or < prophet_min_unique values) skip Prophet",
         "If Prophet's validation MAPE <= 0.3 → use Prophet",
         "Else choose best fallback based on validation error"
     ],
     "metrics": ["MAPE"],  # Primary metric for model selection
-    "fallback_priority": ["SES", "MA", "Naive"]  # Priority order for fallbacks
+    "fallback_priority": ["SES", "MA", "Naive"],  # Priority order for fallbacks
+    "prophet_min_points": 180,  # Minimum series length worth a Prophet fit
+    "prophet_max_skus": 100,  # Cap on Prophet fits per training run (top-N by volume)
+    "prophet_min_std": 1e-6,  # Below this training std the series is treated as flat
+    "prophet_min_unique": 3  # Fewer distinct values than this is treated as flat
 }
 
 # Forecast Output Configuration
@@ -148,11 +161,15 @@ RECOMMENDATION_CONFIG = {
 
 # Model Persistence Configuration
 PERSISTENCE_CONFIG = {
-    "save_format": "Pickle (.pkl)",
+    "save_format": "Pickle index (.pkl) + per-SKU joblib files",
     "save_path": "model/trendwise_forecaster.pkl",
     "load_on_startup": True,
     "backup_enabled": True,
-    "backup_path": "model/trendwise_forecaster_backup.pkl"
+    "backup_path": "model/trendwise_forecaster_backup.pkl",
+    "pickle_protocol": pickle.HIGHEST_PROTOCOL,
+    "optimize_on_write": False,  # pickletools.optimize() for write-once/read-many stores
+    "compress": 3,  # joblib compression level for per-SKU model files
+    "sales_cache": True  # Parquet cache of preprocessed sales beside the model (needs pyarrow)
 }
 
 # API Integration Configuration
@@ -169,7 +186,9 @@ API_CONFIG = {
 PERFORMANCE_CONFIG = {
     "training": {
         "max_skus_per_batch": 100,
-        "parallel_processing": False,
+        "parallel_processing": True,  # Fit SKUs in parallel worker processes
+        "n_jobs": -1,  # -1 = one worker per CPU core
+        "backend": "loky",
         "memory_limit_mb": 1024
     },
     "prediction": {
@@ -215,6 +234,14 @@ FULL_CONFIG = {
     "error_handling": ERROR_HANDLING_CONFIG
 }
 
+# Flat (section, key) -> value index so hot paths resolve a parameter in one lookup
+_FLAT = {
+    (section, key): value
+    for section, settings in FULL_CONFIG.items()
+    for key, value in settings.items()
+}
+
+@functools.lru_cache(maxsize=32)
 def get_config(section=None):
     """
     Get configuration for a specific section or all configurations.
@@ -243,5 +270,23 @@ def update_config(section, key, value):
     """
     if section in FULL_CONFIG and key in FULL_CONFIG[section]:
         FULL_CONFIG[section][key] = value
+        _FLAT[(section, key)] = value
+        get_config.cache_clear()
         return True
     return False
+
+def get_param(section, key):
+    """
+    Get a single configuration value.
+    
+    Args:
+        section (str): Configuration section name
+        key (str): Configuration key
+        
+    Returns:
+        The configuration value
+        
+    Raises:
+        KeyError: If the section/key pair does not exist
+    """
+    return _FLAT[(section, key)]
@@ -3,15 +3,50 @@ Sample Data Generator for TrendWise Demand Forecaster
 Creates realistic sales and inventory data for testing and demonstration.
 """
 
+import functools
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
+
+# PyArrow for optional Parquet output
+try:
+    import pyarrow
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+def _inventory_dtype(names, skus, categories):
+    """Column layout of generated inventory data, with text fields sized to their longest value."""
+    def width(values):
+        return max(map(len, values), default=1)
+    
+    return np.dtype([
+        ('Name', f'U{width(names)}'),
+        ('SKU', f'U{width(skus)}'),
+        ('Category', f'U{width(categories)}'),
+        ('Current Stock', 'i4'),
+        ('Price', 'f8'),
+        ('Total Value', 'f8')
+    ])
+
+# January..December demand multipliers for the seasonal sample products
+SEASONAL_TABLES = {
+    # High demand in winter, moderate in late fall/early spring
+    'WINTER_COAT': np.array([8, 8, 4, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 4, 8]),
+    # High demand in summer, moderate in late spring/early fall
+    'SUMMER_DRESS': np.array([0.3, 0.3, 0.3, 0.3, 3, 6, 6, 6, 3, 0.3, 0.3, 0.3]),
+    # High demand in December, some in November
+    'CHRISTMAS_TREE': np.array([0.1] * 10 + [3, 15])
+}
 
 class SampleDataGenerator:
     """Generate realistic sample data for testing the TrendWise Demand Forecaster."""
     
-    def __init__(self):
+    def __init__(self, seed=42):
+        # Single seeded generator so every draw comes from one reproducible
+        # RNG stream; pass seed=None for fresh random data on every run
+        self._rng = np.random.default_rng(seed)
+        
         self.products = {
             'PROD001': {
                 'name': 'Smartphone X',
@@ -92,9 +127,9 @@ class SampleDataGenerator:
         Generate realistic sales data.
         
         Args:
-            start_date (datetime): Start date for sales data
-            end_date (datetime): End date for sales data
-            products (list): List of product SKUs to generate data for
+            start_date (datetime or np.datetime64): Start date for sales data
+            end_date (datetime or np.datetime64): End date for sales data
+            products (list or tuple): Product SKUs to generate data for
             
         Returns:
             pd.DataFrame: Sales data with columns [date, sku, sales_qty]
@@ -107,62 +142,97 @@ class SampleDataGenerator:
             products = list(self.products.keys())
         
         dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        sales_data = []
+        products = [sku for sku in products if sku in self.products]
+        qty = self._daily_quantities(products, dates)
+        
+        # Build the frame column-wise: one array per column, typed up front
+        return pd.DataFrame({
+            'date': np.tile(dates.values, len(products)),
+            'sku': pd.Categorical(
+                np.repeat(np.array(products, dtype=object), len(dates)),
+                categories=list(self.products.keys())
+            ),
+            'sales_qty': qty.ravel()
+        })
+    
+    def generate_sales_from_index(self, index):
+        """
+        Generate sales data for a prebuilt (sku, date) index.
+        
+        Args:
+            index (pd.MultiIndex): Full product of SKUs x daily dates, SKU-major,
+                as built by pd.MultiIndex.from_product([skus, dates]). SKUs
+                without a product profile are dropped, as in generate_sales_data.
+            
+        Returns:
+            pd.DataFrame: Sales data with columns [date, sku, sales_qty]
+        """
+        index = index[index.get_level_values('sku').isin(list(self.products))]
+        products = list(index.unique(level='sku'))
+        dates = pd.DatetimeIndex(index.unique(level='date'))
         
-        for sku in products:
-            if sku not in self.products:
-                continue
-                
+        # Quantities are laid out SKU-major over consecutive days, so the index must match exactly
+        daily = len(dates) == 0 or dates.equals(pd.date_range(dates[0], periods=len(dates), freq='D'))
+        if not daily or not index.equals(pd.MultiIndex.from_product([products, dates])):
+            raise ValueError("Index must be the SKU-major product of its SKUs and consecutive daily dates")
+        
+        qty = self._daily_quantities(products, dates)
+        return pd.DataFrame({
+            'date': index.get_level_values('date').values,
+            'sku': pd.Categorical(index.get_level_values('sku'), categories=list(self.products.keys())),
+            'sales_qty': qty.ravel()
+        })
+    
+    def _daily_quantities(self, products, dates):
+        """Simulated daily quantities as a (len(products), len(dates)) int16 array."""
+        # Calendar features shared by every SKU
+        n_days = len(dates)
+        weekday = dates.weekday.values
+        day = dates.day.values
+        days_since_start = np.arange(n_days)
+        
+        # One preallocated row of daily quantities per SKU
+        qty = np.empty((len(products), n_days), dtype=np.int16)
+        for i, sku in enumerate(products):
             product = self.products[sku]
             
-            for date in dates:
-                # Base demand
-                demand = product['base_demand']
-                
-                # Add seasonality
-                if product['seasonality'] == 'weekly':
-                    # Weekend boost for electronics
-                    if date.weekday() >= 5:  # Saturday, Sunday
-                        demand += 10
-                elif product['seasonality'] == 'monthly':
-                    # First week boost for clothing
-                    if date.day <= 7:
-                        demand += 8
-                elif product['seasonality'] == 'daily':
-                    # Weekday boost for food
-                    if date.weekday() < 5:  # Monday to Friday
-                        demand += 15
-                
-                # Add trend
-                days_since_start = (date - start_date).days
-                trend_effect = days_since_start * product['trend']
-                demand += trend_effect
-                
-                # Add noise/volatility
-                noise = np.random.normal(0, product['volatility'])
-                demand += noise
-                
-                # Ensure non-negative
-                demand = max(0, int(demand))
-                
-                # Add some zero sales days (realistic)
-                if random.random() < 0.05:  # 5% chance of zero sales
-                    demand = 0
-                
-                sales_data.append({
-                    'date': date,
-                    'sku': sku,
-                    'sales_qty': demand
-                })
+            # Base demand
+            demand = np.full(n_days, product['base_demand'], dtype=np.float64)
+            
+            # Add seasonality
+            if product['seasonality'] == 'weekly':
+                # Weekend boost for electronics
+                demand[weekday >= 5] += 10  # Saturday, Sunday
+            elif product['seasonality'] == 'monthly':
+                # First week boost for clothing
+                demand[day <= 7] += 8
+            elif product['seasonality'] == 'daily':
+                # Weekday boost for food
+                demand[weekday < 5] += 15  # Monday to Friday
+            
+            # Add trend
+            demand += days_since_start * product['trend']
+            
+            # Add noise/volatility
+            demand += self._rng.normal(0.0, product['volatility'], size=n_days)
+            
+            # Ensure non-negative
+            demand = np.maximum(0, demand.astype(np.int64))
+            
+            # Add some zero sales days (realistic)
+            demand[self._rng.random(n_days) < 0.05] = 0  # 5% chance of zero sales
+            
+            # Daily quantities stay in the hundreds, so int16 is plenty
+            qty[i] = demand
         
-        return pd.DataFrame(sales_data)
+        return qty
     
     def generate_inventory_data(self, products=None):
         """
         Generate realistic inventory data.
         
         Args:
-            products (list): List of product SKUs to generate data for
+            products (list or tuple): Product SKUs to generate data for
             
         Returns:
             pd.DataFrame: Inventory data with standard columns
@@ -170,31 +240,34 @@ class SampleDataGenerator:
         if products is None:
             products = list(self.products.keys())
         
-        inventory_data = []
+        products = [sku for sku in products if sku in self.products]
+        specs = [self.products[sku] for sku in products]
+        n_products = len(products)
         
-        for sku in products:
-            if sku not in self.products:
-                continue
-                
-            product = self.products[sku]
-            
-            # Generate realistic current stock based on base demand
-            base_stock = product['base_demand'] * random.uniform(2, 5)  # 2-5 days of stock
-            current_stock = max(0, int(base_stock + np.random.normal(0, base_stock * 0.3)))
-            
-            # Calculate total value
-            total_value = current_stock * product['price']
-            
-            inventory_data.append({
-                'Name': product['name'],
-                'SKU': sku,
-                'Category': product['category'],
-                'Current Stock': current_stock,
-                'Price': product['price'],
-                'Total Value': round(total_value, 2)
-            })
+        names = [product['name'] for product in specs]
+        categories = [product['category'] for product in specs]
         
-        return pd.DataFrame(inventory_data)
+        # Typed record array: every column gets its final dtype up front
+        inventory = np.empty(n_products, dtype=_inventory_dtype(names, products, categories))
+        inventory['Name'] = names
+        inventory['SKU'] = products
+        inventory['Category'] = categories
+        
+        # Generate realistic current stock based on base demand
+        base_demand = np.array([product['base_demand'] for product in specs], dtype=np.float64)
+        base_stock = base_demand * self._rng.uniform(2, 5, size=n_products)  # 2-5 days of stock
+        current_stock = np.maximum(0, (base_stock + self._rng.normal(0.0, base_stock * 0.3)).astype(np.int32))
+        inventory['Current Stock'] = current_stock
+        
+        # Calculate total value
+        price = np.array([product['price'] for product in specs], dtype=np.float64)
+        inventory['Price'] = price
+        inventory['Total Value'] = np.round(current_stock * price, 2)
+        
+        return pd.DataFrame(inventory).astype({
+            'SKU': pd.CategoricalDtype(list(self.products.keys())),
+            'Category': 'category'
+        })
     
     def generate_seasonal_sales_data(self, start_date=None, end_date=None):
         """
@@ -213,9 +286,8 @@ class SampleDataGenerator:
             end_date = datetime(2024, 12, 31)
         
         dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        sales_data = []
         
-        # Seasonal products
+        # Seasonal products (demand multipliers live in SEASONAL_TABLES)
         seasonal_products = {
             'WINTER_COAT': {
                 'name': 'Winter Coat',
@@ -237,79 +309,61 @@ class SampleDataGenerator:
             }
         }
         
-        for sku, product in seasonal_products.items():
-            for date in dates:
-                demand = product['base_demand']
-                
-                # Winter coat: high demand in winter months
-                if sku == 'WINTER_COAT':
-                    month = date.month
-                    if month in [12, 1, 2]:  # Winter
-                        demand *= 8
-                    elif month in [11, 3]:  # Late fall/early spring
-                        demand *= 4
-                    else:
-                        demand *= 0.5
-                
-                # Summer dress: high demand in summer months
-                elif sku == 'SUMMER_DRESS':
-                    month = date.month
-                    if month in [6, 7, 8]:  # Summer
-                        demand *= 6
-                    elif month in [5, 9]:  # Late spring/early fall
-                        demand *= 3
-                    else:
-                        demand *= 0.3
-                
-                # Christmas tree: high demand in December
-                elif sku == 'CHRISTMAS_TREE':
-                    month = date.month
-                    if month == 12:
-                        demand *= 15
-                    elif month == 11:
-                        demand *= 3
-                    else:
-                        demand *= 0.1
-                
-                # Add noise
-                demand += np.random.normal(0, demand * 0.3)
-                demand = max(0, int(demand))
-                
-                sales_data.append({
-                    'date': date,
-                    'sku': sku,
-                    'sales_qty': demand
-                })
+        n_days = len(dates)
+        month_index = dates.month.values - 1
         
-        return pd.DataFrame(sales_data)
+        qty = np.empty((len(seasonal_products), n_days), dtype=np.int16)
+        for i, (sku, product) in enumerate(seasonal_products.items()):
+            # Look up the month multiplier for every day at once
+            demand = product['base_demand'] * SEASONAL_TABLES[sku][month_index]
+            
+            # Add noise
+            demand = demand + self._rng.normal(0.0, demand * 0.3)
+            qty[i] = np.maximum(0, demand.astype(np.int64))
+        
+        return pd.DataFrame({
+            'date': np.tile(dates.values, len(seasonal_products)),
+            'sku': pd.Categorical(np.repeat(np.array(list(seasonal_products), dtype=object), n_days)),
+            'sales_qty': qty.ravel()
+        })
     
-    def save_sample_data(self, output_dir="model/sample_data"):
+    def save_sample_data(self, output_dir="model/sample_data", output_format="csv", return_frames=False):
         """
         Generate and save sample data files.
         
         Args:
             output_dir (str): Directory to save sample data files
+            output_format (str): "csv" or "parquet" (zstd-compressed, needs pyarrow)
+            return_frames (bool): Also return the generated (sales_df, inventory_df)
+        
+        Returns:
+            tuple: (sales_df, inventory_df) if return_frames, otherwise None
         """
         import os
         os.makedirs(output_dir, exist_ok=True)
         
+        if output_format == "parquet" and not PYARROW_AVAILABLE:
+            print("Warning: pyarrow not available. Saving sample data as CSV instead.")
+            output_format = "csv"
+        extension = "parquet" if output_format == "parquet" else "csv"
+        
         # Generate regular sales data
         print("Generating regular sales data...")
         sales_df = self.generate_sales_data()
-        sales_df.to_csv(f"{output_dir}/sample_sales.csv", index=False)
-        print(f"Saved {len(sales_df)} sales records to {output_dir}/sample_sales.csv")
+        self._write_frame(sales_df, f"{output_dir}/sample_sales.{extension}")
+        print(f"Saved {len(sales_df)} sales records to {output_dir}/sample_sales.{extension}")
         
         # Generate inventory data
         print("Generating inventory data...")
         inventory_df = self.generate_inventory_data()
-        inventory_df.to_csv(f"{output_dir}/sample_inventory.csv", index=False)
-        print(f"Saved {len(inventory_df)} inventory records to {output_dir}/sample_inventory.csv")
+        self._write_frame(inventory_df, f"{output_dir}/sample_inventory.{extension}")
+        print(f"Saved {len(inventory_df)} inventory records to {output_dir}/sample_inventory.{extension}")
         
         # Generate seasonal sales data
         print("Generating seasonal sales data...")
         seasonal_sales_df = self.generate_seasonal_sales_data()
-        seasonal_sales_df.to_csv(f"{output_dir}/seasonal_sales.csv", index=False)
-        print(f"Saved {len(seasonal_sales_df)} seasonal sales records to {output_dir}/seasonal_sales.csv")
+        self._write_frame(seasonal_sales_df, f"{output_dir}/seasonal_sales.{extension}")
+        print(f"Saved {len(seasonal_sales_df)} seasonal sales records to {output_dir}/seasonal_sales.{extension}")
         
         # Generate seasonal inventory data
         seasonal_inventory_data = [
@@ -339,23 +393,29 @@ class SampleDataGenerator:
             }
         ]
         seasonal_inventory_df = pd.DataFrame(seasonal_inventory_data)
-        seasonal_inventory_df.to_csv(f"{output_dir}/seasonal_inventory.csv", index=False)
-        print(f"Saved {len(seasonal_inventory_df)} seasonal inventory records to {output_dir}/seasonal_inventory.csv")
+        self._write_frame(seasonal_inventory_df, f"{output_dir}/seasonal_inventory.{extension}")
+        print(f"Saved {len(seasonal_inventory_df)} seasonal inventory records to {output_dir}/seasonal_inventory.{extension}")
         
         print(f"\nAll sample data files saved to {output_dir}/")
         print("Files created:")
-        print("  - sample_sales.csv")
-        print("  - sample_inventory.csv")
-        print("  - seasonal_sales.csv")
-        print("  - seasonal_inventory.csv")
-
-def create_minimal_test_data():
-    """
-    Create minimal test data for quick testing.
+        print(f"  - sample_sales.{extension}")
+        print(f"  - sample_inventory.{extension}")
+        print(f"  - seasonal_sales.{extension}")
+        print(f"  - seasonal_inventory.{extension}")
+        
+        if return_frames:
+            return sales_df, inventory_df
     
-    Returns:
-        tuple: (sales_df, inventory_df)
-    """
+    def _write_frame(self, df, path):
+        """Write a DataFrame as CSV or, for .parquet paths, as columnar Parquet."""
+        if path.endswith(".parquet"):
+            df.to_parquet(path, engine='pyarrow', compression='zstd', row_group_size=100_000, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+@functools.lru_cache(maxsize=1)
+def _generate_minimal_test_data():
+    """Generate the minimal test data once per process (see create_minimal_test_data)."""
     generator = SampleDataGenerator()
     
     # Generate minimal data (just 3 products, 3 months)
@@ -374,6 +434,19 @@ def create_minimal_test_data():
     
     return sales_df, inventory_df
 
+def create_minimal_test_data():
+    """
+    Create minimal test data for quick testing.
+    
+    The data is generated once and cached; every call returns fresh copies so
+    callers can modify them freely.
+    
+    Returns:
+        tuple: (sales_df, inventory_df)
+    """
+    sales_df, inventory_df = _generate_minimal_test_data()
+    return sales_df.copy(), inventory_df.copy()
+
 if __name__ == "__main__":
     # Generate and save sample data
     generator = SampleDataGenerator()
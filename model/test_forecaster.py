@@ -6,7 +6,15 @@ Demonstrates the model functionality with sample data.
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from trendwise_forecaster import TrendWiseForecaster, predict_demand, train_forecaster
+import io
+import os
+import pickle
+import sys
+import tempfile
+import types
+from contextlib import redirect_stdout
+from config import get_param, update_config
+from trendwise_forecaster import TrendWiseForecaster, LazyModelStore, PROPHET_AVAILABLE, predict_demand, train_forecaster
 
 def create_sample_sales_data():
     """Create sample sales data for testing."""
@@ -15,54 +23,25 @@ def create_sample_sales_data():
     end_date = datetime(2024, 6, 30)
     dates = pd.date_range(start=start_date, end=end_date, freq='D')
     
-    sales_data = []
+    n_days = len(dates)
+    weekdays = dates.weekday.to_numpy()
+    days_elapsed = (dates - start_date).days.to_numpy()
     
-    # Product 1: Electronics with weekly seasonality
-    for date in dates:
-        # Base demand with weekly pattern (higher on weekends)
-        base_demand = 20
-        weekly_pattern = 10 if date.weekday() >= 5 else 0  # Weekend boost
-        trend = (date - start_date).days * 0.1  # Slight upward trend
-        noise = np.random.normal(0, 5)
-        
-        sales_qty = max(0, int(base_demand + weekly_pattern + trend + noise))
-        sales_data.append({
-            'date': date,
-            'sku': 'PROD001',
-            'sales_qty': sales_qty
-        })
-    
-    # Product 2: Clothing with monthly seasonality
-    for date in dates:
-        # Base demand with monthly pattern
-        base_demand = 15
-        monthly_pattern = 8 if date.day <= 7 else 0  # First week boost
-        trend = (date - start_date).days * 0.05  # Gentle upward trend
-        noise = np.random.normal(0, 3)
-        
-        sales_qty = max(0, int(base_demand + monthly_pattern + trend + noise))
-        sales_data.append({
-            'date': date,
-            'sku': 'PROD002',
-            'sales_qty': sales_qty
-        })
-    
-    # Product 3: Food items with daily seasonality
-    for date in dates:
-        # Base demand with daily pattern
-        base_demand = 30
-        daily_pattern = 15 if date.weekday() < 5 else 0  # Weekday boost
-        trend = (date - start_date).days * 0.02  # Very gentle trend
-        noise = np.random.normal(0, 4)
-        
-        sales_qty = max(0, int(base_demand + daily_pattern + trend + noise))
-        sales_data.append({
-            'date': date,
-            'sku': 'PROD003',
-            'sales_qty': sales_qty
-        })
-    
-    return pd.DataFrame(sales_data)
+    # Product 1: Electronics with weekly seasonality (higher on weekends, slight upward trend)
+    prod1 = 20 + np.where(weekdays >= 5, 10, 0) + days_elapsed * 0.1 + np.random.normal(0, 5, n_days)
+    
+    # Product 2: Clothing with monthly seasonality (first week boost, gentle upward trend)
+    prod2 = 15 + np.where(dates.day.to_numpy() <= 7, 8, 0) + days_elapsed * 0.05 + np.random.normal(0, 3, n_days)
+    
+    # Product 3: Food items with daily seasonality (weekday boost, very gentle trend)
+    prod3 = 30 + np.where(weekdays < 5, 15, 0) + days_elapsed * 0.02 + np.random.normal(0, 4, n_days)
+    
+    demand = np.concatenate([prod1, prod2, prod3])
+    return pd.DataFrame({
+        'date': np.tile(dates, 3),
+        'sku': np.repeat(['PROD001', 'PROD002', 'PROD003'], n_days),
+        'sales_qty': np.maximum(0, demand.astype(int))
+    })
 
 def create_sample_inventory_data():
     """Create sample inventory data for testing."""
@@ -175,8 +154,19 @@ def test_data_validation():
     except ValueError as e:
         print(f"   ✅ Correctly caught error: {e}")
     
+    # Test with a single date per SKU
+    print("\n2. Testing single-date SKUs...")
+    single_dates = pd.DataFrame({
+        'date': ['2024-01-01', '2024-01-01'],
+        'sku': ['A', 'B'],
+        'sales_qty': [3, 4]
+    })
+    processed = TrendWiseForecaster().preprocess_sales_data(single_dates)
+    assert len(processed) == 2 and list(processed['sales_qty']) == [3, 4]
+    print("   ✅ Single-date SKUs are preprocessed as daily series")
+    
     # Test with insufficient data
-    print("\n2. Testing insufficient data...")
+    print("\n3. Testing insufficient data...")
     minimal_sales = pd.DataFrame({
         'date': pd.date_range('2024-01-01', periods=30, freq='D'),
         'sku': ['PROD001'] * 30,
@@ -190,6 +180,235 @@ def test_data_validation():
     except Exception as e:
         print(f"   Error: {e}")
 
+def test_sample_data_reproducibility():
+    """Test that seeded sample data generation is reproducible."""
+    print("\n=== Testing Sample Data Reproducibility ===\n")
+    
+    from sample_data_generator import SampleDataGenerator
+    
+    first = SampleDataGenerator(seed=7).generate_sales_data()
+    second = SampleDataGenerator(seed=7).generate_sales_data()
+    other = SampleDataGenerator(seed=8).generate_sales_data()
+    
+    assert first.equals(second), "Same seed should give identical sales data"
+    assert not first.equals(other), "Different seeds should give different sales data"
+    print("   ✅ Seeded generators are reproducible")
+
+def test_sales_from_index():
+    """Test that index-based sales generation matches generate_sales_data and rejects other layouts."""
+    print("\n=== Testing Sales Generation From an Index ===\n")
+    
+    from sample_data_generator import SampleDataGenerator
+    
+    dates = pd.date_range('2024-01-01', '2024-03-31', freq='D')
+    skus = ['PROD001', 'PROD002', 'UNKNOWN']
+    index = pd.MultiIndex.from_product([skus, dates], names=['sku', 'date'])
+    
+    expected = SampleDataGenerator(seed=3).generate_sales_data(dates[0], dates[-1], skus)
+    assert SampleDataGenerator(seed=3).generate_sales_from_index(index).equals(expected)
+    print("   ✅ Matches generate_sales_data, dropping unknown SKUs")
+    
+    invalid = [
+        pd.MultiIndex.from_product([dates, skus], names=['date', 'sku']),  # date-major
+        index[::-1],  # unsorted
+        pd.MultiIndex.from_product([skus, dates[::7]], names=['sku', 'date'])  # weekly
+    ]
+    for bad_index in invalid:
+        try:
+            SampleDataGenerator().generate_sales_from_index(bad_index)
+            raise AssertionError("Index with a different layout should be rejected")
+        except ValueError:
+            pass
+    print("   ✅ Rejects date-major, unsorted and non-daily indexes")
+
+def test_inventory_text_columns():
+    """Test that generated inventory keeps long names, SKUs and categories whole."""
+    print("\n=== Testing Inventory Text Columns ===\n")
+    
+    from sample_data_generator import SampleDataGenerator
+    
+    generator = SampleDataGenerator()
+    long_name = 'Extra Long Product Name ' * 4
+    generator.products['PRODUCT-WITH-A-VERY-LONG-SKU'] = dict(
+        generator.products['PROD001'], name=long_name, category='Consumer Electronics Accessories'
+    )
+    inventory = generator.generate_inventory_data(['PRODUCT-WITH-A-VERY-LONG-SKU'])
+    assert inventory.loc[0, 'Name'] == long_name and inventory.loc[0, 'SKU'] == 'PRODUCT-WITH-A-VERY-LONG-SKU'
+    assert inventory.loc[0, 'Category'] == 'Consumer Electronics Accessories'
+    print("   ✅ Long inventory names, SKUs and categories are not truncated")
+
+def test_flat_series_skips_prophet():
+    """Test that nearly constant series skip Prophet, also under parallel training."""
+    print("\n=== Testing Flat Series Handling ===\n")
+    
+    dates = pd.date_range('2024-01-01', periods=120, freq='D')
+    flat = pd.DataFrame({'date': dates, 'sku': 'FLAT001', 'sales_qty': 10.0})
+    
+    output = io.StringIO()
+    with redirect_stdout(output):
+        trained = TrendWiseForecaster._train_sku('FLAT001', flat, use_prophet=True)
+    assert trained is not None and trained[1] != 'Prophet', "Flat series should use a fallback model"
+    if PROPHET_AVAILABLE:
+        assert "Skipping Prophet for SKU FLAT001" in output.getvalue()
+    print(f"   ✅ Flat series trained with {trained[1]}")
+    
+    # Thresholds changed at runtime must reach parallel workers too
+    sales_df = create_sample_sales_data()
+    original_unique = get_param('model_selection', 'prophet_min_unique')
+    original_training = get_param('performance', 'training')
+    update_config('model_selection', 'prophet_min_unique', 10**9)
+    try:
+        for parallel in (False, True):
+            update_config('performance', 'training',
+                          dict(original_training, parallel_processing=parallel, n_jobs=2))
+            with tempfile.TemporaryDirectory() as tmp:
+                forecaster = TrendWiseForecaster(model_path=os.path.join(tmp, "forecaster.pkl"))
+                results = forecaster.train_forecaster(sales_df)
+            assert all(r['model_type'] != 'Prophet' for r in results.values()), \
+                f"prophet_min_unique ignored with parallel_processing={parallel}"
+        print("   ✅ Runtime thresholds honoured in sequential and parallel training")
+    finally:
+        update_config('model_selection', 'prophet_min_unique', original_unique)
+        update_config('performance', 'training', original_training)
+
+def test_lazy_model_store():
+    """Test the per-SKU model store: lazy loading, deletes, flushes and legacy indexes."""
+    print("\n=== Testing Lazy Model Store ===\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store_dir = os.path.join(tmp, "store")
+        store = LazyModelStore(store_dir)
+        unsafe_skus = ['PROD001', 'A/B', '../../escape']
+        for i, sku in enumerate(unsafe_skus):
+            store[sku] = {'type': 'Naive', 'value': float(i)}
+        store.flush()
+        
+        # Every file stays inside the store, whatever the SKU looks like
+        assert sorted(os.listdir(tmp)) == ['store'], "SKU names must not create files outside the store"
+        assert len(os.listdir(store_dir)) == 3
+        print("   ✅ Unsafe SKU names are stored under hashed file names")
+        
+        # A new store over the same files loads nothing until a model is requested
+        reopened = LazyModelStore(store_dir, store.files)
+        assert set(reopened) == set(unsafe_skus) and not reopened._loaded
+        assert reopened['A/B']['value'] == 1.0 and list(reopened._loaded) == ['A/B']
+        print("   ✅ Models load lazily on first access")
+        
+        del reopened['../../escape']
+        reopened.flush()
+        assert '../../escape' not in reopened and len(os.listdir(store_dir)) == 2
+        print("   ✅ Deleted SKUs have their files removed on flush")
+        
+        # Legacy single-file index: models are adopted and split out on the next save
+        model_path = os.path.join(tmp, "legacy.pkl")
+        with open(model_path, 'wb') as f:
+            pickle.dump({'models': {'PROD001': {'type': 'MA', 'value': 5.0}},
+                         'metadata': {'PROD001': {'model_type': 'MA'}}}, f)
+        forecaster = TrendWiseForecaster(model_path=model_path)
+        assert forecaster.models['PROD001']['value'] == 5.0
+        forecaster.save_model()
+        with open(model_path, 'rb') as f:
+            index = pickle.load(f)
+        assert 'models' not in index and set(index['files']) == {'PROD001'}
+        assert TrendWiseForecaster(model_path=model_path).models['PROD001']['value'] == 5.0
+        print("   ✅ Legacy model files migrate to the per-SKU store")
+        
+        # Legacy models from a library that is no longer installed are skipped, not fatal
+        missing = types.ModuleType('uninstalled_models')
+        missing.Model = type('Model', (), {'__module__': 'uninstalled_models'})
+        sys.modules['uninstalled_models'] = missing
+        try:
+            legacy = pickle.dumps({'models': {'PROD001': {'type': 'MA', 'value': 5.0}, 'PROD002': missing.Model()},
+                                   'metadata': {'PROD001': {'model_type': 'MA'}, 'PROD002': {'model_type': 'SES'}}})
+        finally:
+            del sys.modules['uninstalled_models']
+        with open(model_path, 'wb') as f:
+            f.write(legacy)
+        forecaster = TrendWiseForecaster(model_path=model_path)
+        assert set(forecaster.models) == {'PROD001'} and set(forecaster.model_metadata) == {'PROD001'}
+        print("   ✅ Legacy models with missing libraries are skipped")
+
+def test_preprocessed_sales_cache():
+    """Test reuse of preprocessed sales in memory and from the Parquet cache."""
+    print("\n=== Testing Preprocessed Sales Cache ===\n")
+    
+    sales_df = create_sample_sales_data()
+    
+    def count_preprocessing(forecaster):
+        calls = []
+        preprocess = forecaster.preprocess_sales_data
+        forecaster.preprocess_sales_data = lambda df: calls.append(1) or preprocess(df)
+        return calls
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "forecaster.pkl")
+        forecaster = TrendWiseForecaster(model_path=model_path)
+        calls = count_preprocessing(forecaster)
+        processed = forecaster._preprocessed_sales(sales_df)
+        assert forecaster._preprocessed_sales(sales_df) is processed and len(calls) == 1
+        subset = forecaster._preprocessed_sales(sales_df, skus=['PROD002'])
+        assert set(subset['sku']) == {'PROD002'} and len(calls) == 1
+        print("   ✅ Repeated calls reuse the in-memory result")
+        
+        if get_param('persistence', 'sales_cache') and os.path.exists(forecaster.sales_cache_path):
+            # A fresh instance reads the Parquet copy, optionally only some SKUs
+            reloaded = TrendWiseForecaster(model_path=model_path)
+            calls = count_preprocessing(reloaded)
+            cached = reloaded._preprocessed_sales(sales_df)
+            assert len(calls) == 0 and cached['sales_qty'].equals(processed['sales_qty'].reset_index(drop=True))
+            subset = reloaded._preprocessed_sales(sales_df, skus=['PROD002'])
+            assert set(subset['sku']) == {'PROD002'} and len(calls) == 0
+            print("   ✅ A new instance reads the Parquet cache, filtered by SKU")
+            
+            # Different SKU categories would encode SKUs differently, so the cache must miss
+            reordered = TrendWiseForecaster(model_path=model_path)
+            reordered.sku_categories = pd.Index(['PROD003', 'PROD002', 'PROD001'])
+            calls = count_preprocessing(reordered)
+            result = reordered._preprocessed_sales(sales_df)
+            assert len(calls) == 1 and list(result['sku'].cat.categories) == ['PROD003', 'PROD002', 'PROD001']
+            print("   ✅ A different SKU category order misses the cache")
+        
+        # Changed sales data misses both caches, and the skus filter applies on a miss too
+        changed = sales_df.assign(sales_qty=sales_df['sales_qty'] + 1)
+        calls = count_preprocessing(forecaster)
+        subset = forecaster._preprocessed_sales(changed, skus=['PROD001'])
+        assert len(calls) == 1 and set(subset['sku']) == {'PROD001'}
+        assert not [name for name in os.listdir(tmp) if name.endswith('.tmp')], "Temporary cache files left behind"
+        print("   ✅ Changed sales data is preprocessed again, filtered by SKU")
+        
+        # An unwritable cache location only loses the cache
+        forecaster.sales_cache_path = os.path.join(tmp, "missing", "sales_cache.parquet")
+        processed = forecaster._preprocessed_sales(sales_df.assign(sales_qty=sales_df['sales_qty'] + 2))
+        assert not processed.empty
+        print("   ✅ Cache write failures do not fail preprocessing")
+
+def test_train_and_predict():
+    """Test that the fused and streaming entry points match train + predict_demand."""
+    print("\n=== Testing Train-and-Predict and Streaming Predictions ===\n")
+    
+    sales_df = create_sample_sales_data()
+    inventory_df = create_sample_inventory_data()
+    
+    # Prophet's intervals are sampled, so compare on the deterministic fallback models
+    original_unique = get_param('model_selection', 'prophet_min_unique')
+    update_config('model_selection', 'prophet_min_unique', 10**9)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            separate = TrendWiseForecaster(model_path=os.path.join(tmp, "separate.pkl"))
+            expected_results = separate.train_forecaster(sales_df)
+            expected = separate.predict_demand(sales_df, inventory_df, lead_time_days=5)
+            
+            fused = TrendWiseForecaster(model_path=os.path.join(tmp, "fused.pkl"))
+            results, predictions = fused.train_and_predict(sales_df, inventory_df, lead_time_days=5)
+            assert results == expected_results and predictions == expected
+            print(f"   ✅ train_and_predict matches train_forecaster + predict_demand ({len(predictions)} predictions)")
+            
+            streamed = list(separate.iter_predictions(sales_df, inventory_df, lead_time_days=5, batch_size=2))
+            assert streamed == expected
+            print("   ✅ iter_predictions yields the same predictions in batches")
+    finally:
+        update_config('model_selection', 'prophet_min_unique', original_unique)
+
 def test_model_persistence():
     """Test model saving and loading."""
     print("\n=== Testing Model Persistence ===\n")
@@ -216,6 +435,13 @@ if __name__ == "__main__":
     # Run all tests
     test_basic_functionality()
     test_data_validation()
+    test_sample_data_reproducibility()
+    test_sales_from_index()
+    test_inventory_text_columns()
+    test_flat_series_skips_prophet()
+    test_lazy_model_store()
+    test_preprocessed_sales_cache()
+    test_train_and_predict()
     test_model_persistence()
     
     print("\n" + "="*50)
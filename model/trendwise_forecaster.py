@@ -7,12 +7,25 @@ capturing seasonal patterns, trends, and uncertainty, then generating stock reco
 import pandas as pd
 import numpy as np
 import pickle
+import pickletools
+import hashlib
+import math
 import os
+import tempfile
+from collections.abc import MutableMapping
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 import warnings
+import joblib
+from joblib import Parallel, delayed
 warnings.filterwarnings('ignore')
 
+# Shared model settings (module import when run as a script, package import otherwise)
+try:
+    from config import get_param
+except ImportError:
+    from .config import get_param
+
 # Prophet for advanced time series forecasting
 try:
     from prophet import Prophet
@@ -21,14 +34,202 @@ except ImportError:
     PROPHET_AVAILABLE = False
     print("Warning: Prophet not available. Using fallback models only.")
 
-# Statsmodels for fallback models
+# Numba for JIT-compiled fallback kernels (optional; kernels run as plain Python otherwise)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# PyArrow for the Parquet cache of preprocessed sales (optional; cache disabled otherwise)
 try:
-    from statsmodels.tsa.holtwinters import SimpleExpSmoothing
-    from statsmodels.tsa.stattools import adfuller
-    STATSMODELS_AVAILABLE = True
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
 except ImportError:
-    STATSMODELS_AVAILABLE = False
-    print("Warning: Statsmodels not available. Limited fallback models.")
+    PYARROW_AVAILABLE = False
+
+JIT_ENABLED = NUMBA_AVAILABLE and get_param('fallback_models', 'jit')
+
+# 95% interval half-width per unit of daily std, for a 30-day demand total
+_CI_SCALE_MONTHLY = 1.96 * math.sqrt(30)
+
+
+def _jit(func):
+    """Compile a numeric kernel with Numba when it is available and enabled."""
+    if JIT_ENABLED:
+        return njit(cache=True, fastmath=True)(func)
+    return func
+
+def _moving_average(y: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing moving averages of a series using a cumulative sum.
+    
+    O(n) regardless of window size. Windows longer than the series are
+    shrunk to the series length (min_periods=1 behaviour).
+    """
+    y = np.asarray(y, dtype=np.float64)
+    window = max(1, min(window, len(y)))
+    csum = np.cumsum(np.insert(y, 0, 0.0))
+    return (csum[window:] - csum[:-window]) / window
+
+
+@_jit
+def _ses_sse(y: np.ndarray, alpha: float) -> Tuple[float, float]:
+    """
+    Run the simple exponential smoothing recurrence
+    level_t = alpha * y_t + (1 - alpha) * level_{t-1}.
+    
+    Returns:
+        Tuple of (one-step-ahead sum of squared errors, final level)
+    """
+    level = y[0]
+    sse = 0.0
+    for t in range(1, y.size):
+        error = y[t] - level
+        sse += error * error
+        level += alpha * error
+    return sse, level
+
+
+@_jit
+def _mape_kernel(actual: np.ndarray, predicted: np.ndarray) -> float:
+    """Single-pass MAPE over the non-zero actuals (inf if there are none)."""
+    total = 0.0
+    count = 0
+    for i in range(actual.size):
+        if actual[i] != 0:
+            total += abs((actual[i] - predicted[i]) / actual[i])
+            count += 1
+    if count == 0:
+        return np.inf
+    return total / count
+
+
+def _fit_ses(y: np.ndarray, alpha: Optional[float] = None,
+             tol: float = 1e-4) -> Tuple[float, float]:
+    """
+    Fit simple exponential smoothing.
+    
+    When no smoothing level is given it is chosen by golden-section search
+    over [0, 1] on the one-step-ahead SSE.
+    
+    Returns:
+        Tuple of (alpha, final level); the level is the flat SES forecast
+    """
+    y = np.asarray(y, dtype=np.float64)
+    
+    if alpha is None:
+        inv_phi = (np.sqrt(5.0) - 1.0) / 2.0
+        lo, hi = 0.0, 1.0
+        a = hi - inv_phi * (hi - lo)
+        b = lo + inv_phi * (hi - lo)
+        sse_a = _ses_sse(y, a)[0]
+        sse_b = _ses_sse(y, b)[0]
+        while hi - lo > tol:
+            if sse_a < sse_b:
+                hi, b, sse_b = b, a, sse_a
+                a = hi - inv_phi * (hi - lo)
+                sse_a = _ses_sse(y, a)[0]
+            else:
+                lo, a, sse_a = a, b, sse_b
+                b = lo + inv_phi * (hi - lo)
+                sse_b = _ses_sse(y, b)[0]
+        alpha = (lo + hi) / 2.0
+    
+    return alpha, _ses_sse(y, alpha)[1]
+
+
+class _UnavailableModel:
+    """Stand-in for a pickled object whose defining module is not installed."""
+    
+    def __init__(self, *args, **kwargs):
+        pass
+    
+    def __setstate__(self, state):
+        pass
+
+
+class _LegacyModelUnpickler(pickle.Unpickler):
+    """
+    Unpickler for model index files that substitutes _UnavailableModel for classes
+    from modules that are no longer installed (statsmodels SES results in
+    single-file stores), so the remaining models still load.
+    """
+    
+    def find_class(self, module, name):
+        try:
+            return super().find_class(module, name)
+        except ModuleNotFoundError:
+            return _UnavailableModel
+
+
+class LazyModelStore(MutableMapping):
+    """
+    Per-SKU model store backed by one joblib file per SKU.
+    Models are read from disk on first access and cached; writes mark the SKU dirty
+    so only changed models are rewritten on save. Files are named by a hash of the
+    SKU, since SKUs come from uploaded data and are not safe to use as paths.
+    """
+    
+    def __init__(self, store_dir: str, files: Optional[Dict[str, str]] = None):
+        self.store_dir = store_dir
+        self._files = dict(files or {})  # SKU -> file name of its model on disk
+        self._available = set(self._files)  # SKUs with a model, on disk or pending flush
+        self._loaded = {}
+        self._dirty = set()
+    
+    @property
+    def files(self) -> Dict[str, str]:
+        """SKU -> file name mapping for the models on disk, as saved in the index."""
+        return dict(self._files)
+    
+    @staticmethod
+    def _file_name(sku: str) -> str:
+        return hashlib.sha1(str(sku).encode('utf-8')).hexdigest() + '.joblib'
+    
+    def __getitem__(self, sku):
+        if sku not in self._loaded:
+            if sku not in self._available:
+                raise KeyError(sku)
+            self._loaded[sku] = joblib.load(os.path.join(self.store_dir, self._files[sku]))
+        return self._loaded[sku]
+    
+    def __setitem__(self, sku, model):
+        self._loaded[sku] = model
+        self._available.add(sku)
+        self._dirty.add(sku)
+    
+    def __delitem__(self, sku):
+        if sku not in self._available:
+            raise KeyError(sku)
+        self._available.discard(sku)
+        self._loaded.pop(sku, None)
+        self._dirty.add(sku)
+    
+    def __contains__(self, sku):
+        return sku in self._available
+    
+    def __iter__(self):
+        return iter(self._available)
+    
+    def __len__(self):
+        return len(self._available)
+    
+    def flush(self, compress=3):
+        """Write dirty models to disk and drop files for deleted SKUs."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        for sku in self._dirty:
+            old_name = self._files.pop(sku, None)
+            if sku in self._available:
+                self._files[sku] = self._file_name(sku)
+                joblib.dump(self._loaded[sku], os.path.join(self.store_dir, self._files[sku]), compress=compress)
+            if old_name is not None and old_name != self._files.get(sku):
+                old_path = os.path.join(self.store_dir, old_name)
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+        self._dirty.clear()
+
 
 class TrendWiseForecaster:
     """
@@ -37,9 +238,15 @@ class TrendWiseForecaster:
     
     def __init__(self, model_path: str = "model/trendwise_forecaster.pkl"):
         self.model_path = model_path
-        self.models = {}  # Store trained models for each SKU
+        self.store_dir = os.path.splitext(model_path)[0]  # Per-SKU model files live beside the index
+        self.models = LazyModelStore(self.store_dir)  # Store trained models for each SKU
         self.model_metadata = {}  # Store metadata about each model
+        self.sku_categories = None  # SKU category order from training, reused so codes stay stable
         self.load_on_startup = True
+        self.sales_cache_path = os.path.join(os.path.dirname(model_path), "sales_cache.parquet")
+        self._future_df_cache = {}  # (last_date, horizon) -> future 'ds' frame for Prophet
+        self._preprocessed_fingerprint = None  # Input fingerprint of _preprocessed_cache
+        self._preprocessed_cache = None
         
         # Create model directory if it doesn't exist
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
@@ -63,71 +270,164 @@ class TrendWiseForecaster:
         if not all(col in sales_df.columns for col in required_cols):
             raise ValueError(f"Sales data must contain columns: {required_cols}")
         
-        # Parse dates and sort chronologically
-        sales_df['date'] = pd.to_datetime(sales_df['date'])
-        sales_df = sales_df.sort_values(['sku', 'date'])
+        # Parse dates and encode SKUs as categories (on a copy, so the caller's frame
+        # and its fingerprint are unchanged)
+        sales_df = sales_df.assign(date=pd.to_datetime(sales_df['date']), sku=self._sku_categorical(sales_df['sku']))
         
         # Aggregate sales by date and SKU if multiple entries exist
-        sales_df = sales_df.groupby(['date', 'sku'])['sales_qty'].sum().reset_index()
+        sales_df = sales_df.groupby(['sku', 'date'], observed=True)['sales_qty'].sum().reset_index()
+        if sales_df.empty:
+            return sales_df[['date', 'sku', 'sales_qty']]
         
-        # Auto-detect frequency and fill missing dates
-        for sku in sales_df['sku'].unique():
-            sku_data = sales_df[sales_df['sku'] == sku].copy()
-            
-            # Detect frequency
-            date_diffs = sku_data['date'].diff().dropna()
-            if len(date_diffs) > 0:
-                most_common_diff = date_diffs.mode().iloc[0]
-                if most_common_diff.days == 1:
-                    freq = 'D'
-                elif most_common_diff.days == 7:
-                    freq = 'W'
-                else:
-                    freq = 'D'  # Default to daily
-            else:
-                freq = 'D'
-            
-            # Create complete date range
-            date_range = pd.date_range(
-                start=sku_data['date'].min(),
-                end=sku_data['date'].max(),
-                freq=freq
-            )
-            
-            # Reindex and fill missing values with 0
-            complete_data = pd.DataFrame({'date': date_range})
-            complete_data = complete_data.merge(sku_data, on='date', how='left')
-            complete_data['sku'] = sku
-            complete_data['sales_qty'] = complete_data['sales_qty'].fillna(0)
-            
-            # Remove or cap extreme outliers using IQR
-            q1 = complete_data['sales_qty'].quantile(0.25)
-            q3 = complete_data['sales_qty'].quantile(0.75)
-            iqr = q3 - q1
-            lower_bound = q1 - 1.5 * iqr
-            upper_bound = q3 + 1.5 * iqr
-            
-            # Cap outliers instead of removing
-            complete_data['sales_qty'] = np.where(
-                complete_data['sales_qty'] < lower_bound,
-                lower_bound,
-                complete_data['sales_qty']
-            )
-            complete_data['sales_qty'] = np.where(
-                complete_data['sales_qty'] > upper_bound,
-                upper_bound,
-                complete_data['sales_qty']
-            )
-            
-            # Optional log1p transform for skewed series
-            if complete_data['sales_qty'].skew() > 1.0:
-                complete_data['sales_qty'] = np.log1p(complete_data['sales_qty'])
-            
-            # Update the dataframe
-            sales_df = sales_df[sales_df['sku'] != sku]
-            sales_df = pd.concat([sales_df, complete_data], ignore_index=True)
+        # Auto-detect frequency and fill missing dates with 0
+        sales = sales_df.set_index(['sku', 'date'])['sales_qty']
+        sales = sales.reindex(self._complete_date_index(sales_df), fill_value=0).astype(np.float64)
+        
+        # Cap extreme outliers per SKU using IQR; both quartiles come from one
+        # grouped quantile call and are broadcast back over each SKU's contiguous rows
+        grouped = sales.groupby(level='sku', sort=False)
+        group_sizes = grouped.size().to_numpy()
+        quartiles = grouped.quantile([0.25, 0.75]).to_numpy().reshape(-1, 2)
+        q1, q3 = quartiles[:, 0], quartiles[:, 1]
+        iqr = q3 - q1
+        sales = sales.clip(lower=np.repeat(q1 - 1.5 * iqr, group_sizes),
+                           upper=np.repeat(q3 + 1.5 * iqr, group_sizes))
+        
+        # Optional log1p transform for skewed series (skew of the capped values, so a separate pass)
+        skew = np.repeat(sales.groupby(level='sku', sort=False).skew().to_numpy(), group_sizes)
+        sales = sales.where(~(skew > 1.0), np.log1p(sales))
         
-        return sales_df.sort_values(['sku', 'date'])
+        return sales.reset_index()[['date', 'sku', 'sales_qty']]
+    
+    def _preprocessed_sales(self, sales_df: pd.DataFrame, skus: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Preprocess sales data, reusing the last result in memory or the Parquet cache
+        when either was built from the same input. With skus given, only those SKUs are
+        returned. Callers must treat the result as read-only, since it may be shared.
+        """
+        fingerprint = self._sales_fingerprint(sales_df)
+        
+        if fingerprint == self._preprocessed_fingerprint:
+            processed = self._preprocessed_cache
+            return processed if skus is None else processed[processed['sku'].isin(skus)]
+        
+        use_parquet = PYARROW_AVAILABLE and get_param('persistence', 'sales_cache')
+        if use_parquet:
+            try:
+                cached = pq.read_schema(self.sales_cache_path).metadata.get(b'sales_fingerprint')
+            except (OSError, AttributeError, pa.ArrowInvalid):
+                cached = None
+            
+            if cached == fingerprint:
+                return pd.read_parquet(
+                    self.sales_cache_path,
+                    columns=['date', 'sku', 'sales_qty'],
+                    filters=[('sku', 'in', list(skus))] if skus is not None else None
+                )
+        
+        processed = self.preprocess_sales_data(sales_df)
+        self._preprocessed_fingerprint, self._preprocessed_cache = fingerprint, processed
+        
+        if use_parquet:
+            self._write_sales_cache(processed, fingerprint)
+        return processed if skus is None else processed[processed['sku'].isin(skus)]
+    
+    def _write_sales_cache(self, processed: pd.DataFrame, fingerprint: bytes):
+        """
+        Write the Parquet sales cache through a temporary file and an atomic rename,
+        so concurrent readers never see a partial file. Failures only lose the cache.
+        """
+        table = pa.Table.from_pandas(processed, preserve_index=False)
+        table = table.replace_schema_metadata({**table.schema.metadata, b'sales_fingerprint': fingerprint})
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(self.sales_cache_path) or '.')
+            os.close(fd)
+            pq.write_table(table, tmp_path, compression='zstd')
+            os.replace(tmp_path, self.sales_cache_path)
+        except OSError as e:
+            print(f"Warning: could not write sales cache: {e}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+    
+    def _sku_categorical(self, skus: pd.Series) -> pd.Series:
+        """Categorical SKU column using the training category order, with unseen SKUs appended."""
+        skus = skus.astype('category')
+        if self.sku_categories is not None:
+            skus = skus.cat.set_categories(self.sku_categories.union(skus.cat.categories, sort=False))
+        return skus
+    
+    def _sales_fingerprint(self, sales_df: pd.DataFrame) -> bytes:
+        """
+        Content hash of the raw sales columns and of the SKU categories preprocessing
+        would encode them with, used to key cached preprocessing results.
+        """
+        hashes = pd.util.hash_pandas_object(sales_df[['date', 'sku', 'sales_qty']], index=False)
+        categories = self._sku_categorical(sales_df['sku']).cat.categories
+        digest = hashlib.sha1(hashes.to_numpy().tobytes())
+        digest.update(pd.util.hash_pandas_object(categories, index=False).to_numpy().tobytes())
+        return digest.hexdigest().encode()
+    
+    @staticmethod
+    def _complete_date_index(sales_df: pd.DataFrame) -> pd.MultiIndex:
+        """
+        Build the gap-free (sku, date) index covering each SKU's date span at
+        its detected frequency (daily or weekly).
+        """
+        date_groups = sales_df.groupby('sku', observed=True)['date']
+        bounds = date_groups.agg(['min', 'max'])
+        freqs = TrendWiseForecaster._detect_frequencies(sales_df, len(bounds))
+        
+        date_ranges = [
+            pd.date_range(start=start, end=end, freq=freq)
+            for start, end, freq in zip(bounds['min'], bounds['max'], freqs)
+        ]
+        return pd.MultiIndex.from_arrays(
+            [
+                bounds.index.repeat([len(r) for r in date_ranges]),
+                np.concatenate([r.values for r in date_ranges])
+            ],
+            names=['sku', 'date']
+        )
+    
+    @staticmethod
+    def _detect_frequencies(sales_df: pd.DataFrame, n_skus: int) -> List[str]:
+        """
+        Detect whether each SKU's sales dates are daily ('D') or weekly ('W').
+        
+        Expects rows grouped by SKU and sorted by date within each SKU (as the
+        aggregated frame is), with SKUs in the same order as the groupby result.
+        The modal gap between consecutive dates is taken per SKU on int64
+        nanoseconds, ties going to the shorter gap.
+        """
+        codes = pd.factorize(sales_df['sku'])[0]
+        ns = sales_df['date'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        
+        # Gaps between consecutive dates of the same SKU
+        same_sku = codes[1:] == codes[:-1]
+        gap_codes = codes[1:][same_sku]
+        gaps = np.diff(ns)[same_sku]
+        if len(gaps) == 0:
+            return ['D'] * n_skus  # No SKU has two dates, so all stay daily
+        
+        # Count runs of equal (sku, gap) pairs, then keep the most frequent gap per SKU
+        order = np.lexsort((gaps, gap_codes))
+        gap_codes, gaps = gap_codes[order], gaps[order]
+        run_starts = np.flatnonzero(np.concatenate((
+            [True], (gap_codes[1:] != gap_codes[:-1]) | (gaps[1:] != gaps[:-1])
+        )))
+        run_counts = np.diff(np.append(run_starts, len(gaps)))
+        run_codes, run_gaps = gap_codes[run_starts], gaps[run_starts]
+        
+        best = np.lexsort((run_gaps, -run_counts, run_codes))
+        first = best[np.concatenate(([True], run_codes[best][1:] != run_codes[best][:-1]))]
+        
+        modal_days = np.full(n_skus, -1, dtype=np.int64)  # SKUs with a single date stay daily
+        modal_days[run_codes[first]] = run_gaps[first] // 86_400_000_000_000
+        return np.where(modal_days == 7, 'W', 'D').tolist()
     
     def train_forecaster(self, sales_df: pd.DataFrame) -> Dict:
         """
@@ -139,108 +439,67 @@ class TrendWiseForecaster:
         Returns:
             Dictionary with training results
         """
-        sales_df = self.preprocess_sales_data(sales_df)
-        results = {}
+        return self._train_preprocessed(self._preprocessed_sales(sales_df))
+    
+    def train_and_predict(self, sales_df: pd.DataFrame, inventory_df: pd.DataFrame,
+                          lead_time_days: int = 7) -> Tuple[Dict, List[Dict]]:
+        """
+        Train on the sales data and predict for the inventory, preprocessing and
+        fingerprinting the sales data once for both steps.
         
-        for sku in sales_df['sku'].unique():
-            sku_data = sales_df[sales_df['sku'] == sku].copy()
+        Args:
+            sales_df: Sales data DataFrame
+            inventory_df: Inventory data DataFrame
+            lead_time_days: Lead time in days for safety stock calculation
             
-            if len(sku_data) < 90:  # Minimum data requirement
-                print(f"Warning: SKU {sku} has insufficient data ({len(sku_data)} points). Skipping.")
+        Returns:
+            Tuple of (training results, predictions)
+        """
+        processed = self._preprocessed_sales(sales_df)
+        results = self._train_preprocessed(processed)
+        
+        inventory_skus = inventory_df['SKU'].tolist()
+        sales_summary, safety_stock_by_sku = self._prediction_inputs(
+            processed[processed['sku'].isin(inventory_skus)], lead_time_days
+        )
+        predictions = self._predict_batch(
+            inventory_skus, inventory_df['Current Stock'].tolist(),
+            sales_summary, safety_stock_by_sku
+        )
+        return results, predictions
+    
+    def _train_preprocessed(self, sales_df: pd.DataFrame) -> Dict:
+        """Fit and store a model per SKU of an already preprocessed sales frame."""
+        self.sku_categories = sales_df['sku'].cat.categories
+        results = {}
+        
+        groups = self._split_by_sku(sales_df)
+        prophet_skus = self._select_prophet_skus(groups)
+        settings = self._training_settings()
+        training_config = get_param('performance', 'training')
+        parallel = training_config['parallel_processing'] and len(groups) > 1
+        batch_size = training_config['max_skus_per_batch']
+        
+        # Each SKU is fitted independently, so fan batches out across worker processes.
+        # One Parallel context keeps the same worker pool alive for every batch.
+        fitted = []
+        with Parallel(n_jobs=training_config['n_jobs'] if parallel else 1,
+                      backend=training_config['backend']) as workers:
+            for start in range(0, len(groups), batch_size):
+                batch = groups[start:start + batch_size]
+                if parallel:
+                    fitted.extend(workers(
+                        delayed(self._train_sku)(sku, sku_data, sku in prophet_skus, settings)
+                        for sku, sku_data in batch
+                    ))
+                else:
+                    fitted.extend(self._train_sku(sku, sku_data, sku in prophet_skus, settings)
+                                  for sku, sku_data in batch)
+        
+        for (sku, sku_data), trained in zip(groups, fitted):
+            if trained is None:
                 continue
-            
-            # Prepare data for Prophet
-            prophet_data = sku_data[['date', 'sales_qty']].rename(
-                columns={'date': 'ds', 'sales_qty': 'y'}
-            )
-            
-            # Split data for validation (last 30 days)
-            train_data = prophet_data.iloc[:-30]
-            val_data = prophet_data.iloc[-30:]
-            
-            # Try Prophet first
-            prophet_model = None
-            prophet_mape = float('inf')
-            
-            if PROPHET_AVAILABLE:
-                try:
-                    prophet_model = Prophet(
-                        seasonality_mode='additive',
-                        weekly_seasonality=True,
-                        daily_seasonality='auto',
-                        yearly_seasonality=False,
-                        changepoint_prior_scale=0.05,
-                        seasonality_prior_scale=10
-                    )
-                    prophet_model.fit(train_data)
-                    
-                    # Validate Prophet model
-                    prophet_forecast = prophet_model.predict(val_data[['ds']])
-                    prophet_mape = self._calculate_mape(val_data['y'], prophet_forecast['yhat'])
-                    
-                except Exception as e:
-                    print(f"Prophet training failed for SKU {sku}: {e}")
-                    prophet_mape = float('inf')
-            
-            # Try fallback models
-            fallback_model = None
-            fallback_mape = float('inf')
-            fallback_type = None
-            
-            if STATSMODELS_AVAILABLE:
-                # Simple Exponential Smoothing
-                try:
-                    # Set proper date index for statsmodels
-                    train_data_indexed = train_data.copy()
-                    train_data_indexed = train_data_indexed.set_index('ds')
-                    
-                    ses_model = SimpleExpSmoothing(train_data_indexed['y'])
-                    ses_fitted = ses_model.fit()
-                    ses_forecast = ses_fitted.forecast(len(val_data))
-                    ses_mape = self._calculate_mape(val_data['y'], ses_forecast)
-                    
-                    if ses_mape < fallback_mape:
-                        fallback_model = ses_fitted
-                        fallback_mape = ses_mape
-                        fallback_type = 'SES'
-                except Exception as e:
-                    print(f"SES training failed for SKU {sku}: {e}")
-                    pass
-                
-                # Moving Average
-                try:
-                    ma_forecast = train_data['y'].rolling(window=7).mean().iloc[-1]
-                    ma_forecast = [ma_forecast] * len(val_data)
-                    ma_mape = self._calculate_mape(val_data['y'], ma_forecast)
-                    
-                    if ma_mape < fallback_mape:
-                        fallback_model = {'type': 'MA', 'value': ma_forecast[0]}
-                        fallback_mape = ma_mape
-                        fallback_type = 'MA'
-                except:
-                    pass
-            
-            # Naive Last-Value
-            try:
-                naive_forecast = [train_data['y'].iloc[-1]] * len(val_data)
-                naive_mape = self._calculate_mape(val_data['y'], naive_forecast)
-                
-                if naive_mape < fallback_mape:
-                    fallback_model = {'type': 'Naive', 'value': naive_forecast[0]}
-                    fallback_mape = naive_mape
-                    fallback_type = 'Naive'
-            except:
-                pass
-            
-            # Model selection logic
-            if prophet_mape <= 0.3 and prophet_model is not None:
-                selected_model = prophet_model
-                selected_type = 'Prophet'
-                selected_mape = prophet_mape
-            else:
-                selected_model = fallback_model
-                selected_type = fallback_type
-                selected_mape = fallback_mape
+            selected_model, selected_type, selected_mape, forecast = trained
             
             # Store model and metadata
             self.models[sku] = selected_model
@@ -248,7 +507,8 @@ class TrendWiseForecaster:
                 'model_type': selected_type,
                 'validation_mape': selected_mape,
                 'last_trained': datetime.now(),
-                'data_points': len(sku_data)
+                'data_points': len(sku_data),
+                'forecast': forecast
             }
             
             results[sku] = {
@@ -262,6 +522,192 @@ class TrendWiseForecaster:
         
         return results
     
+    @staticmethod
+    def _split_by_sku(sales_df: pd.DataFrame) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        Split sales data into per-SKU frames.
+        
+        Sorts once by (sku code, date) and slices at the code boundaries, which
+        avoids hashing SKU strings for every group.
+        """
+        if sales_df.empty:
+            return []
+        
+        sku_codes = sales_df['sku'].astype('category').cat.codes.to_numpy()
+        order = np.lexsort((sales_df['date'].to_numpy(), sku_codes))
+        sales_df = sales_df.iloc[order]
+        sku_codes = sku_codes[order]
+        
+        starts = np.flatnonzero(np.diff(sku_codes)) + 1
+        bounds = zip(np.r_[0, starts], np.r_[starts, len(sales_df)])
+        return [(sales_df['sku'].iat[start], sales_df.iloc[start:end]) for start, end in bounds]
+    
+    @staticmethod
+    def _select_prophet_skus(groups: List[Tuple[str, pd.DataFrame]]) -> set:
+        """
+        Decide which SKUs are worth a Prophet fit.
+        
+        Prophet is orders of magnitude slower than the fallback models, so it is
+        reserved for series long enough to benefit from it and, on large
+        catalogs, for the highest-volume SKUs only.
+        """
+        min_points = get_param('model_selection', 'prophet_min_points')
+        max_skus = get_param('model_selection', 'prophet_max_skus')
+        
+        eligible = [(sku, sku_data) for sku, sku_data in groups if len(sku_data) >= min_points]
+        if len(eligible) > max_skus:
+            eligible.sort(key=lambda item: item[1]['sales_qty'].sum(), reverse=True)
+            eligible = eligible[:max_skus]
+        
+        return {sku for sku, _ in eligible}
+    
+    @staticmethod
+    def _training_settings() -> Dict:
+        """
+        Collect the configuration _train_sku uses. Read in the parent process and
+        passed to workers, which re-import config and would not see update_config changes.
+        """
+        return {
+            'prophet_params': get_param('prophet', 'params'),
+            'prophet_min_std': get_param('model_selection', 'prophet_min_std'),
+            'prophet_min_unique': get_param('model_selection', 'prophet_min_unique'),
+            'smoothing_level': get_param('fallback_models', 'ses_config')['smoothing_level'],
+            'window_size': get_param('fallback_models', 'moving_average_config')['window_size'],
+        }
+    
+    @staticmethod
+    def _train_sku(sku: str, sku_data: pd.DataFrame, use_prophet: bool = True,
+                   settings: Optional[Dict] = None) -> Optional[Tuple[object, str, float, Optional[Dict]]]:
+        """
+        Fit and select the best model for a single SKU.
+        
+        Runs in a worker process when parallel training is enabled, so it must
+        not touch instance state or read config itself.
+        
+        Args:
+            sku: SKU identifier
+            sku_data: Preprocessed sales rows for this SKU
+            use_prophet: Whether to try Prophet before the fallback models
+            settings: Training configuration from _training_settings (read now if omitted)
+        
+        Returns:
+            Tuple of (model, model_type, validation_mape, forecast), or None if
+            the SKU has insufficient data. forecast holds the next-month Prophet
+            forecast from the end of sku_data (None for fallback models).
+        """
+        if settings is None:
+            settings = TrendWiseForecaster._training_settings()
+        
+        if len(sku_data) < 90:  # Minimum data requirement
+            print(f"Warning: SKU {sku} has insufficient data ({len(sku_data)} points). Skipping.")
+            return None
+        
+        # Prepare data for Prophet
+        prophet_data = sku_data[['date', 'sales_qty']].rename(
+            columns={'date': 'ds', 'sales_qty': 'y'}
+        )
+        
+        # Split data for validation (last 30 days)
+        train_data = prophet_data.iloc[:-30]
+        val_data = prophet_data.iloc[-30:]
+        
+        # Try Prophet first
+        prophet_model = None
+        prophet_mape = float('inf')
+        
+        # Nearly flat series (e.g. slow movers flattened by the IQR cap) gain nothing from Prophet
+        if PROPHET_AVAILABLE and use_prophet:
+            y_train = train_data['y'].to_numpy()
+            if (y_train.std() < settings['prophet_min_std']
+                    or np.unique(y_train).size < settings['prophet_min_unique']):
+                print(f"Skipping Prophet for SKU {sku}: series is nearly constant.")
+                use_prophet = False
+        
+        if PROPHET_AVAILABLE and use_prophet:
+            try:
+                prophet_model = Prophet(**settings['prophet_params'])
+                prophet_model.fit(train_data)
+                
+                # Validate Prophet model
+                prophet_forecast = prophet_model.predict(val_data[['ds']])
+                prophet_mape = TrendWiseForecaster._calculate_mape(val_data['y'], prophet_forecast['yhat'])
+                
+            except Exception as e:
+                print(f"Prophet training failed for SKU {sku}: {e}")
+                prophet_mape = float('inf')
+        
+        # Try fallback models
+        fallback_model = None
+        fallback_mape = float('inf')
+        fallback_type = None
+        
+        # Simple Exponential Smoothing
+        try:
+            alpha, ses_level = _fit_ses(train_data['y'].to_numpy(), settings['smoothing_level'])
+            ses_forecast = [ses_level] * len(val_data)
+            ses_mape = TrendWiseForecaster._calculate_mape(val_data['y'], ses_forecast)
+            
+            if ses_mape < fallback_mape:
+                fallback_model = {'type': 'SES', 'alpha': alpha, 'value': ses_level}
+                fallback_mape = ses_mape
+                fallback_type = 'SES'
+        except Exception as e:
+            print(f"SES training failed for SKU {sku}: {e}")
+            pass
+        
+        # Moving Average
+        try:
+            ma_forecast = _moving_average(train_data['y'].to_numpy(), settings['window_size'])[-1]
+            ma_forecast = [ma_forecast] * len(val_data)
+            ma_mape = TrendWiseForecaster._calculate_mape(val_data['y'], ma_forecast)
+            
+            if ma_mape < fallback_mape:
+                fallback_model = {'type': 'MA', 'value': ma_forecast[0]}
+                fallback_mape = ma_mape
+                fallback_type = 'MA'
+        except:
+            pass
+    
+        # Naive Last-Value
+        try:
+            naive_forecast = [train_data['y'].iloc[-1]] * len(val_data)
+            naive_mape = TrendWiseForecaster._calculate_mape(val_data['y'], naive_forecast)
+            
+            if naive_mape < fallback_mape:
+                fallback_model = {'type': 'Naive', 'value': naive_forecast[0]}
+                fallback_mape = naive_mape
+                fallback_type = 'Naive'
+        except:
+            pass
+        
+        # Model selection logic
+        if prophet_mape <= 0.3 and prophet_model is not None:
+            selected_model = prophet_model
+            selected_type = 'Prophet'
+            selected_mape = prophet_mape
+        else:
+            selected_model = fallback_model
+            selected_type = fallback_type
+            selected_mape = fallback_mape
+        
+        # Forecast the month after the training data while the model is in memory,
+        # so prediction from the same origin needn't load or run Prophet again
+        forecast = None
+        if selected_type == 'Prophet':
+            last_date = prophet_data['ds'].iloc[-1]
+            future_df = pd.DataFrame({
+                'ds': pd.date_range(start=last_date + timedelta(days=1), periods=30, freq='D')
+            })
+            future = selected_model.predict(future_df)
+            forecast = {
+                'origin': last_date,
+                'point_forecast': future['yhat'].sum(),
+                'lower_ci': future['yhat_lower'].sum(),
+                'upper_ci': future['yhat_upper'].sum()
+            }
+        
+        return selected_model, selected_type, selected_mape, forecast
+    
     def predict_demand(self, sales_df: pd.DataFrame, inventory_df: pd.DataFrame, 
                       lead_time_days: int = 7) -> List[Dict]:
         """
@@ -275,96 +721,174 @@ class TrendWiseForecaster:
         Returns:
             List of dictionaries containing forecast and recommendations
         """
+        sales_summary, safety_stock_by_sku = self._prepare_predictions(sales_df, inventory_df, lead_time_days)
+        
+        # Column-wise access; .tolist() yields plain Python scalars without per-row Series
+        return self._predict_batch(
+            inventory_df['SKU'].tolist(), inventory_df['Current Stock'].tolist(),
+            sales_summary, safety_stock_by_sku
+        )
+    
+    def iter_predictions(self, sales_df: pd.DataFrame, inventory_df: pd.DataFrame,
+                         lead_time_days: int = 7, batch_size: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yield the same predictions as predict_demand, scoring inventory rows in
+        batches so the first results are available before the whole catalog is done.
+        
+        Args:
+            sales_df: Sales data DataFrame
+            inventory_df: Inventory data DataFrame
+            lead_time_days: Lead time in days for safety stock calculation
+            batch_size: Inventory rows per batch (defaults to the prediction batch_size setting)
+        """
+        if batch_size is None:
+            batch_size = get_param('performance', 'prediction')['batch_size']
+        sales_summary, safety_stock_by_sku = self._prepare_predictions(sales_df, inventory_df, lead_time_days)
+        
+        skus = inventory_df['SKU'].tolist()
+        stocks = inventory_df['Current Stock'].tolist()
+        for start in range(0, len(skus), batch_size):
+            yield from self._predict_batch(
+                skus[start:start + batch_size], stocks[start:start + batch_size],
+                sales_summary, safety_stock_by_sku
+            )
+    
+    def _prepare_predictions(self, sales_df: pd.DataFrame, inventory_df: pd.DataFrame,
+                             lead_time_days: int) -> Tuple[Dict[str, Dict], pd.Series]:
+        """
+        Train if needed and compute the per-SKU aggregates every prediction batch looks up.
+        
+        Returns:
+            Tuple of (sales summary by SKU, safety stock by SKU)
+        """
         # Ensure models are trained
         if not self.models:
             print("No trained models found. Training models first...")
             self.train_forecaster(sales_df)
         
-        sales_df = self.preprocess_sales_data(sales_df)
-        predictions = []
+        return self._prediction_inputs(
+            self._preprocessed_sales(sales_df, skus=inventory_df['SKU'].tolist()), lead_time_days
+        )
+    
+    def _prediction_inputs(self, sales_df: pd.DataFrame,
+                           lead_time_days: int) -> Tuple[Dict[str, Dict], pd.Series]:
+        """Per-SKU sales summary and safety stock for preprocessed sales data."""
+        self._future_df_cache = {}
         
-        for _, inventory_row in inventory_df.iterrows():
-            sku = inventory_row['SKU']
-            current_stock = inventory_row['Current Stock']
-            
+        # Per-SKU aggregates (including safety stock) computed once, then looked up per inventory row
+        demand_std_by_sku = sales_df.groupby('sku', observed=True)['sales_qty'].std()
+        safety_stock_by_sku = pd.Series(
+            self._calculate_safety_stock(demand_std_by_sku.to_numpy(dtype=np.float64), lead_time_days),
+            index=demand_std_by_sku.index
+        )
+        return self._summarize_sales(sales_df), safety_stock_by_sku
+    
+    def _predict_batch(self, inventory_skus: List[str], inventory_stocks: List, sales_summary: Dict[str, Dict],
+                       safety_stock_by_sku: pd.Series) -> List[Dict]:
+        """Forecast and score a batch of inventory rows given as parallel SKU/stock lists."""
+        # Gather per-SKU forecasts, then score every SKU in one vectorized pass
+        skus, stocks, forecasts = [], [], []
+        for sku, current_stock in zip(inventory_skus, inventory_stocks):
             if sku not in self.models:
                 print(f"Warning: No model found for SKU {sku}. Skipping.")
                 continue
             
             # Get forecast
-            forecast_result = self._get_forecast(sku, sales_df)
+            forecast_result = self._get_forecast(sku, sales_summary.get(sku))
             
             if forecast_result is None:
                 continue
             
-            # Calculate safety stock
-            safety_stock = self._calculate_safety_stock(sku, sales_df, lead_time_days)
-            
-            # Generate stock recommendation
-            recommendation = self._generate_recommendation(
-                forecast_result['point_forecast'],
-                current_stock,
-                safety_stock
-            )
-            
-            # Calculate confidence score
-            confidence_score = 1 - ((forecast_result['upper_ci'] - forecast_result['lower_ci']) / 
-                                   max(1, forecast_result['point_forecast']))
-            
-            prediction = {
+            skus.append(sku)
+            stocks.append(current_stock)
+            forecasts.append(forecast_result)
+        
+        if not skus:
+            return []
+        
+        point_forecast = np.array([f['point_forecast'] for f in forecasts], dtype=np.float64)
+        lower_ci = np.array([f['lower_ci'] for f in forecasts], dtype=np.float64)
+        upper_ci = np.array([f['upper_ci'] for f in forecasts], dtype=np.float64)
+        
+        # Look up safety stock
+        safety_stock = safety_stock_by_sku.reindex(skus, fill_value=0.0).to_numpy(dtype=np.float64)
+        
+        # Generate stock recommendations
+        recommendations = self._generate_recommendations(
+            point_forecast,
+            np.array(stocks, dtype=np.float64),
+            safety_stock
+        )
+        
+        # Calculate confidence scores
+        confidence_score = 1 - (upper_ci - lower_ci) / np.maximum(1, point_forecast)
+        
+        return [
+            {
                 'sku': sku,
-                'point_forecast': forecast_result['point_forecast'],
-                'lower_ci': forecast_result['lower_ci'],
-                'upper_ci': forecast_result['upper_ci'],
-                'confidence_score': confidence_score,
+                'point_forecast': point,
+                'lower_ci': lower,
+                'upper_ci': upper,
+                'confidence_score': confidence,
                 'model_used': self.model_metadata[sku]['model_type'],
                 'current_stock': current_stock,
-                'safety_stock': safety_stock,
+                'safety_stock': safety,
                 'recommendation': recommendation
             }
-            
-            predictions.append(prediction)
+            for sku, point, lower, upper, confidence, current_stock, safety, recommendation in zip(
+                skus, point_forecast.tolist(), lower_ci.tolist(), upper_ci.tolist(),
+                confidence_score.tolist(), stocks, safety_stock.tolist(), recommendations.tolist()
+            )
+        ]
+    
+    def _summarize_sales(self, sales_df: pd.DataFrame) -> Dict[str, Dict]:
+        """
+        Collect the per-SKU aggregates needed for forecasting in one pass.
+        
+        Returns:
+            Dictionary mapping SKU to its last sales date and the mean and
+            standard deviation of its most recent 30 periods
+        """
+        sales_df = sales_df.sort_values(['sku', 'date'], kind='stable')
+        last_date = sales_df.groupby('sku', observed=True)['date'].last()
+        recent = sales_df.groupby('sku', observed=True, sort=False).tail(30)
+        stats = recent.groupby('sku', observed=True)['sales_qty'].agg(['mean', 'std'])
         
-        return predictions
+        return {
+            sku: {'last_date': date, 'recent_mean': mean, 'recent_std': std}
+            for sku, date, mean, std in zip(
+                last_date.index.tolist(), last_date.tolist(), stats['mean'].tolist(), stats['std'].tolist()
+            )
+        }
     
-    def _get_forecast(self, sku: str, sales_df: pd.DataFrame) -> Optional[Dict]:
-        """Get forecast for a specific SKU."""
-        if sku not in self.models:
+    def _get_forecast(self, sku: str, sku_summary: Optional[Dict]) -> Optional[Dict]:
+        """Get forecast for a specific SKU from its precomputed sales summary."""
+        if sku not in self.models or sku_summary is None:
             return None
         
-        model = self.models[sku]
         model_type = self.model_metadata[sku]['model_type']
         
-        # Get recent data for the SKU
-        sku_data = sales_df[sales_df['sku'] == sku].copy()
-        if len(sku_data) == 0:
-            return None
-        
         # Generate forecast based on model type
         if model_type == 'Prophet':
-            # Create future dates for next month
-            last_date = sku_data['date'].max()
-            future_dates = pd.date_range(
-                start=last_date + timedelta(days=1),
-                periods=30,
-                freq='D'
-            )
-            future_df = pd.DataFrame({'ds': future_dates})
+            cached = self.model_metadata[sku].get('forecast')
+            if cached is not None and cached['origin'] == sku_summary['last_date']:
+                return {key: cached[key] for key in ('point_forecast', 'lower_ci', 'upper_ci')}
             
-            forecast = model.predict(future_df)
+            model = self.models[sku]
+            # Future dates for next month, shared by every SKU with the same last date
+            forecast = model.predict(self._future_frame(sku_summary['last_date'], 30))
             point_forecast = forecast['yhat'].sum()  # Sum for monthly forecast
             lower_ci = forecast['yhat_lower'].sum()
             upper_ci = forecast['yhat_upper'].sum()
             
         elif model_type in ['SES', 'MA', 'Naive']:
             # For fallback models, use simple extrapolation
-            recent_data = sku_data['sales_qty'].tail(30)
-            point_forecast = recent_data.mean() * 30  # Monthly forecast
+            point_forecast = sku_summary['recent_mean'] * 30  # Monthly forecast
             
             # Simple confidence intervals
-            std_dev = recent_data.std()
-            lower_ci = max(0, point_forecast - 1.96 * std_dev * np.sqrt(30))
-            upper_ci = point_forecast + 1.96 * std_dev * np.sqrt(30)
+            std_dev = sku_summary['recent_std']
+            lower_ci = max(0, point_forecast - _CI_SCALE_MONTHLY * std_dev)
+            upper_ci = point_forecast + _CI_SCALE_MONTHLY * std_dev
         
         else:
             return None
@@ -375,62 +899,96 @@ class TrendWiseForecaster:
             'upper_ci': upper_ci
         }
     
-    def _calculate_safety_stock(self, sku: str, sales_df: pd.DataFrame, 
-                               lead_time_days: int) -> float:
-        """Calculate safety stock using the specified formula."""
-        sku_data = sales_df[sales_df['sku'] == sku]['sales_qty']
-        demand_std = sku_data.std()
-        z = 1.28  # For ~80% service level
+    def _future_frame(self, last_date: pd.Timestamp, horizon: int) -> pd.DataFrame:
+        """Daily future 'ds' frame following last_date, cached by (last_date, horizon)."""
+        key = (last_date, horizon)
+        if key not in self._future_df_cache:
+            self._future_df_cache[key] = pd.DataFrame({
+                'ds': pd.date_range(start=last_date + timedelta(days=1), periods=horizon, freq='D')
+            })
+        return self._future_df_cache[key]
+    
+    def _calculate_safety_stock(self, demand_std: np.ndarray, lead_time_days: int) -> np.ndarray:
+        """Calculate safety stock (z * demand_std * sqrt(lead_time)) for an array of SKUs."""
+        z = get_param('recommendation', 'safety_stock')['z_score']  # For ~80% service level
         safety_stock = z * demand_std * np.sqrt(lead_time_days)
-        return max(0, safety_stock)
+        # fmax treats an undefined std (single observation) as zero safety stock
+        return np.fmax(0, safety_stock)
     
-    def _generate_recommendation(self, forecast: float, current_stock: float, 
-                                safety_stock: float) -> str:
-        """Generate stock recommendation based on forecast and current stock."""
-        total_required = forecast + safety_stock
+    def _generate_recommendations(self, forecast: np.ndarray, current_stock: np.ndarray,
+                                  safety_stock: np.ndarray) -> np.ndarray:
+        """Generate stock recommendations for arrays of forecasts and current stock."""
+        labels = get_param('recommendation', 'recommendations')
         
-        if current_stock >= total_required:
-            return "Reduce/Hold"
-        elif current_stock >= forecast:
-            return "Maintain"
-        else:
-            return "Increase"
+        return np.select(
+            [current_stock >= forecast + safety_stock, current_stock >= forecast],
+            [labels['reduce'], labels['maintain']],
+            default=labels['increase']
+        )
     
-    def _calculate_mape(self, actual: pd.Series, predicted: pd.Series) -> float:
+    @staticmethod
+    def _calculate_mape(actual: pd.Series, predicted: pd.Series) -> float:
         """Calculate Mean Absolute Percentage Error."""
-        actual = np.array(actual)
-        predicted = np.array(predicted)
+        # Views over the callers' float buffers, no copies
+        actual = np.asarray(actual, dtype=np.float64)
+        predicted = np.asarray(predicted, dtype=np.float64)
+        if JIT_ENABLED:
+            return _mape_kernel(actual, predicted)
         
         # Avoid division by zero
         mask = actual != 0
-        if not mask.any():
+        n_valid = np.count_nonzero(mask)
+        if n_valid == 0:
             return float('inf')
         
-        return np.mean(np.abs((actual[mask] - predicted[mask]) / actual[mask]))
+        ape = np.divide(actual - predicted, actual, out=np.zeros_like(actual), where=mask)
+        return float(np.abs(ape, out=ape).sum() / n_valid)
     
     def save_model(self):
         """Save the trained models to disk."""
+        # Models are written per SKU; the .pkl holds only the index and metadata
+        self.models.flush(compress=get_param('persistence', 'compress'))
         model_data = {
-            'models': self.models,
+            'files': self.models.files,
+            'sku_categories': None if self.sku_categories is None else self.sku_categories.tolist(),
             'metadata': self.model_metadata
         }
         
+        protocol = get_param('persistence', 'pickle_protocol')
+        
         with open(self.model_path, 'wb') as f:
-            pickle.dump(model_data, f)
+            if get_param('persistence', 'optimize_on_write'):
+                f.write(pickletools.optimize(pickle.dumps(model_data, protocol=protocol)))
+            else:
+                pickle.dump(model_data, f, protocol=protocol)
     
     def load_model(self):
-        """Load trained models from disk."""
+        """Load the model index from disk; individual models load on first use."""
         try:
             with open(self.model_path, 'rb') as f:
-                model_data = pickle.load(f)
+                model_data = _LegacyModelUnpickler(f).load()
             
-            self.models = model_data['models']
+            self.models = LazyModelStore(self.store_dir, model_data.get('files'))
             self.model_metadata = model_data['metadata']
+            if 'models' in model_data:
+                # Legacy single-file store: adopt the models so the next save splits them out,
+                # skipping any whose library is no longer installed
+                unavailable = [sku for sku, model in model_data['models'].items()
+                               if isinstance(model, _UnavailableModel)]
+                for sku in unavailable:
+                    del model_data['models'][sku]
+                    self.model_metadata.pop(sku, None)
+                if unavailable:
+                    print(f"Skipping {len(unavailable)} legacy models whose libraries are not installed "
+                          f"(retrain to restore): {', '.join(map(str, unavailable))}")
+                self.models.update(model_data['models'])
+            if model_data.get('sku_categories') is not None:
+                self.sku_categories = pd.Index(model_data['sku_categories'])
             print(f"Loaded {len(self.models)} trained models.")
             
         except Exception as e:
             print(f"Error loading model: {e}")
-            self.models = {}
+            self.models = LazyModelStore(self.store_dir)
             self.model_metadata = {}
 
 
@@ -8,9 +8,160 @@ This script shows you how to:
 """
 
 import pandas as pd
+import itertools
 import os
-from sample_data_generator import SampleDataGenerator
-from trendwise_forecaster import TrendWiseForecaster
+import sys
+from config import get_param, update_config
+
+# PyArrow's multithreaded CSV reader (optional; pandas' reader is used otherwise)
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+    _SKU_DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Columns the forecaster consumes (others are skipped when parsing) and their types,
+# so pandas skips type inference. SKUs are loaded as categoricals so grouping by them
+# works on integer codes instead of hashing strings.
+SALES_COLS = ['date', 'sku', 'sales_qty']
+INVENTORY_COLS = ['SKU', 'Current Stock']
+SALES_DTYPES = {'sku': str, 'sales_qty': 'float64'}
+INVENTORY_DTYPES = {'SKU': 'category'}
+PARSE_DATES = ['date']
+DATE_FORMAT = '%Y-%m-%d'  # ISO dates, as written by SampleDataGenerator
+SALES_CHUNK_ROWS = 100_000
+
+# quick_test always uses the same 3 SKUs over Q1 2024, so its (sku, date) index is built once
+_QT_PRODS = ('PROD001', 'PROD002', 'PROD003')
+_QT_DATES = pd.date_range('2024-01-01', '2024-03-31', freq='D')
+_QT_INDEX = pd.MultiIndex.from_product([_QT_PRODS, _QT_DATES], names=['sku', 'date'])
+
+def _fast_read(path, columns, column_types):
+    """Read selected CSV columns from a memory-mapped file with PyArrow's threaded parser."""
+    with pa.memory_map(path) as source:
+        table = pacsv.read_csv(
+            source,
+            read_options=pacsv.ReadOptions(block_size=1 << 20, use_threads=True),
+            convert_options=pacsv.ConvertOptions(column_types=column_types, include_columns=columns,
+                                                 timestamp_parsers=[DATE_FORMAT, pacsv.ISO8601])
+        )
+        return table.to_pandas(self_destruct=True, split_blocks=True)
+
+def _cached_read(path, read_csv, columns, write_cache):
+    """
+    Load a CSV through its Feather copy (same name, .feather) when that copy is at
+    least as new as the CSV; otherwise parse the CSV and, if write_cache, save the copy.
+    """
+    if not PYARROW_AVAILABLE:
+        return read_csv(path)
+    
+    cache_path = os.path.splitext(path)[0] + '.feather'
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        return pd.read_feather(cache_path, columns=columns)
+    
+    df = read_csv(path)
+    if write_cache:
+        df.to_feather(cache_path)
+    return df
+
+def _read_sales_csv(path):
+    """
+    Parse a sales CSV with typed columns, parsing ISO dates as it goes. Dates in
+    any other layout are read as text and left to pd.to_datetime.
+    """
+    if PYARROW_AVAILABLE:
+        column_types = {'date': pa.timestamp('ns'), 'sku': _SKU_DICTIONARY, 'sales_qty': pa.float64()}
+        try:
+            return _fast_read(path, SALES_COLS, column_types)
+        except pa.ArrowInvalid:
+            sales_df = _fast_read(path, SALES_COLS, dict(column_types, date=pa.string()))
+    else:
+        reader = pd.read_csv(path, chunksize=SALES_CHUNK_ROWS, usecols=SALES_COLS, dtype=SALES_DTYPES,
+                             parse_dates=PARSE_DATES, date_format=DATE_FORMAT, engine='c',
+                             memory_map=True, low_memory=False)
+        sales_df = pd.concat(reader, ignore_index=True)
+        # Categorize after concatenating, since chunks with differing categories concat to object
+        sales_df['sku'] = sales_df['sku'].astype('category')
+    
+    if not pd.api.types.is_datetime64_any_dtype(sales_df['date']):
+        sales_df['date'] = pd.to_datetime(sales_df['date'])
+    return sales_df
+
+def _read_inventory_csv(path):
+    """Parse an inventory CSV (small, so in one pass)."""
+    if PYARROW_AVAILABLE:
+        return _fast_read(path, INVENTORY_COLS, {'SKU': _SKU_DICTIONARY})
+    
+    return pd.read_csv(path, usecols=INVENTORY_COLS, dtype=INVENTORY_DTYPES, memory_map=True, low_memory=False)
+
+def _read_sales(path, write_cache=False):
+    """Load sales data, preferring a fresh Feather copy of the CSV."""
+    return _cached_read(path, _read_sales_csv, SALES_COLS, write_cache)
+
+def _read_inventory(path, write_cache=False):
+    """Load inventory data, preferring a fresh Feather copy of the CSV."""
+    return _cached_read(path, _read_inventory_csv, INVENTORY_COLS, write_cache)
+
+# Keys of each prediction dict returned by TrendWiseForecaster.predict_demand
+PREDICTION_COLUMNS = ['sku', 'point_forecast', 'lower_ci', 'upper_ci', 'confidence_score',
+                      'model_used', 'current_stock', 'safety_stock', 'recommendation']
+
+def _predictions_frame(predictions):
+    """Columnar view of predict_demand's list of per-SKU dicts."""
+    return pd.DataFrame.from_records(predictions, columns=PREDICTION_COLUMNS)
+
+def _format_prediction_lines(pred_df):
+    """One "<sku>: <forecast> units - <recommendation>" line per prediction (parsed by the Node service)."""
+    if pred_df.empty:
+        return ""
+    lines = (pred_df['sku'].astype(str) + ": "
+             + pred_df['point_forecast'].map("{:.1f}".format) + " units - "
+             + pred_df['recommendation'].astype(str))
+    return "\n".join(lines) + "\n"
+
+def _stream_predictions(predictions, batch_size):
+    """
+    Write prediction lines batch by batch as an iterator yields them, and
+    return how many were written.
+    """
+    count = 0
+    while True:
+        batch = list(itertools.islice(predictions, batch_size))
+        if not batch:
+            return count
+        sys.stdout.write(_format_prediction_lines(_predictions_frame(batch)))
+        sys.stdout.flush()
+        count += len(batch)
+
+def _print_training_summary(training_result):
+    """Print the SKU count and the first SKU's model as an example."""
+    print(f"Training completed! Trained models for {len(training_result)} SKUs")
+    # Show first result as example
+    if training_result:
+        first_sku, info = next(iter(training_result.items()))
+        print(f"Example: {first_sku} - {info['model_type']} (MAPE: {info['validation_mape']:.4f})")
+
+def _n_jobs(value):
+    """argparse type for --n-jobs: any non-zero integer, as joblib accepts."""
+    try:
+        n_jobs = int(value)
+    except ValueError:
+        n_jobs = 0
+    if n_jobs == 0:
+        raise argparse.ArgumentTypeError(f"expected a non-zero integer (-1 = all cores, 1 = sequential), got {value!r}")
+    return n_jobs
+
+def set_training_jobs(n_jobs):
+    """
+    Set how many worker processes train_forecaster fans SKUs out to
+    (-1 = one per CPU core, 1 = train sequentially in this process).
+    """
+    if n_jobs == 0:
+        raise ValueError("n_jobs must be non-zero")
+    training = dict(get_param('performance', 'training'), n_jobs=n_jobs, parallel_processing=n_jobs != 1)
+    update_config('performance', 'training', training)
 
 def generate_and_train():
     """
@@ -19,22 +170,17 @@ def generate_and_train():
     print("=== Step 1: Generate Sample Data ===")
     
     # Create the sample data generator
+    from sample_data_generator import SampleDataGenerator
     generator = SampleDataGenerator()
     
-    # Generate and save sample data to CSV files
-    generator.save_sample_data("model/sample_data")
-    
-    print("\n=== Step 2: Load the CSV Files ===")
+    # Generate and save sample data to CSV files, keeping the generated frames
+    # rather than reading the CSVs straight back
+    sales_df, inventory_df = generator.save_sample_data("model/sample_data", return_frames=True)
     
-    # Load the generated CSV files
-    sales_df = pd.read_csv("model/sample_data/sample_sales.csv")
-    inventory_df = pd.read_csv("model/sample_data/sample_inventory.csv")
+    print("\n=== Step 2: Inspect the Sample Data ===")
     
-    print(f"Loaded sales data: {len(sales_df)} records")
-    print(f"Loaded inventory data: {len(inventory_df)} records")
-    
-    # Convert date column to datetime
-    sales_df['date'] = pd.to_datetime(sales_df['date'])
+    print(f"Sales data: {len(sales_df)} records")
+    print(f"Inventory data: {len(inventory_df)} records")
     
     print("\nSales data preview:")
     print(sales_df.head())
@@ -44,10 +190,11 @@ def generate_and_train():
     print("\n=== Step 3: Train the TrendWise Forecaster ===")
     
     # Create and train the forecaster
+    from trendwise_forecaster import TrendWiseForecaster
     forecaster = TrendWiseForecaster()
     
-    # Train the model with the sales data
-    training_result = forecaster.train_forecaster(sales_df)
+    # Train the model and score the inventory in one pass over the sales data
+    training_result, predictions = forecaster.train_and_predict(sales_df, inventory_df, lead_time_days=7)
     
     print("Training completed!")
     print(f"Models trained for {len(training_result)} SKUs")
@@ -62,17 +209,18 @@ def generate_and_train():
     
     print("\n=== Step 4: Make Predictions ===")
     
-    # Make predictions using the trained model
-    predictions = forecaster.predict_demand(sales_df, inventory_df, lead_time_days=7)
+    pred_df = _predictions_frame(predictions)
     
-    print(f"Generated {len(predictions)} predictions:")
-    for pred in predictions[:5]:  # Show first 5 predictions
-        print(f"SKU: {pred['sku']}")
-        print(f"  Forecast: {pred['point_forecast']:.1f} units")
-        print(f"  Confidence: {pred['confidence_score']:.2f}")
-        print(f"  Recommendation: {pred['recommendation']}")
-        print(f"  Model used: {pred['model_used']}")
-        print()
+    print(f"Generated {len(pred_df)} predictions:")
+    # Format the first 5 predictions up front and write them in one call
+    sys.stdout.write("".join(
+        f"SKU: {pred.sku}\n"
+        f"  Forecast: {pred.point_forecast:.1f} units\n"
+        f"  Confidence: {pred.confidence_score:.2f}\n"
+        f"  Recommendation: {pred.recommendation}\n"
+        f"  Model used: {pred.model_used}\n\n"
+        for pred in pred_df.head(5).itertuples(index=False)
+    ))
     
     return forecaster, predictions
 
@@ -83,31 +231,25 @@ def quick_test():
     print("=== Quick Test with Minimal Data ===")
     
     # Generate minimal test data
+    from sample_data_generator import SampleDataGenerator
     generator = SampleDataGenerator()
-    sales_df, inventory_df = generator.generate_sales_data(
-        start_date=pd.Timestamp('2024-01-01'),
-        end_date=pd.Timestamp('2024-03-31'),
-        products=['PROD001', 'PROD002', 'PROD003']
-    ), generator.generate_inventory_data(['PROD001', 'PROD002', 'PROD003'])
+    sales_df = generator.generate_sales_from_index(_QT_INDEX)
+    inventory_df = generator.generate_inventory_data(_QT_PRODS)
     
     print(f"Generated {len(sales_df)} sales records")
     print(f"Generated {len(inventory_df)} inventory records")
     
     # Train and predict
+    from trendwise_forecaster import TrendWiseForecaster
     forecaster = TrendWiseForecaster()
-    training_result = forecaster.train_forecaster(sales_df)
+    training_result, predictions = forecaster.train_and_predict(sales_df, inventory_df)
     
-    print(f"Training completed! Trained models for {len(training_result)} SKUs")
-    # Show first result as example
-    if training_result:
-        first_sku = list(training_result.keys())[0]
-        print(f"Example: {first_sku} - {training_result[first_sku]['model_type']} (MAPE: {training_result[first_sku]['validation_mape']:.4f})")
+    _print_training_summary(training_result)
     
-    predictions = forecaster.predict_demand(sales_df, inventory_df)
+    pred_df = _predictions_frame(predictions)
     
-    print(f"Generated {len(predictions)} predictions:")
-    for pred in predictions:
-        print(f"{pred['sku']}: {pred['point_forecast']:.1f} units - {pred['recommendation']}")
+    print(f"Generated {len(pred_df)} predictions:")
+    sys.stdout.write(_format_prediction_lines(pred_df))
 
 def load_existing_csv_and_train():
     """
@@ -124,34 +266,24 @@ def load_existing_csv_and_train():
         return
     
     # Load existing CSV files
-    sales_df = pd.read_csv(sales_file)
-    inventory_df = pd.read_csv(inventory_file)
-    
-    # Convert date column
-    sales_df['date'] = pd.to_datetime(sales_df['date'])
+    sales_df = _read_sales(sales_file, write_cache=True)
+    inventory_df = _read_inventory(inventory_file, write_cache=True)
     
     print(f"Loaded {len(sales_df)} sales records from {sales_file}")
     print(f"Loaded {len(inventory_df)} inventory records from {inventory_file}")
     
     # Train the model
+    from trendwise_forecaster import TrendWiseForecaster
     forecaster = TrendWiseForecaster()
-    training_result = forecaster.train_forecaster(sales_df)
+    training_result, predictions = forecaster.train_and_predict(sales_df, inventory_df)
     
-    print(f"Training completed! Trained models for {len(training_result)} SKUs")
-    # Show first result as example
-    if training_result:
-        first_sku = list(training_result.keys())[0]
-        print(f"Example: {first_sku} - {training_result[first_sku]['model_type']} (MAPE: {training_result[first_sku]['validation_mape']:.4f})")
-    
-    # Make predictions
-    predictions = forecaster.predict_demand(sales_df, inventory_df)
+    _print_training_summary(training_result)
     
     print(f"Generated {len(predictions)} predictions")
     return forecaster, predictions
 
 if __name__ == "__main__":
     import argparse
-    import sys
     
     parser = argparse.ArgumentParser(description='TrendWise Demand Forecaster CLI')
     parser.add_argument('--demo', action='store_true', help='Run quick demo')
@@ -164,9 +296,13 @@ if __name__ == "__main__":
     parser.add_argument('--start-date', type=str, help='Start date for sample data')
     parser.add_argument('--end-date', type=str, help='End date for sample data')
     parser.add_argument('--products', type=str, help='Products to generate (JSON string or "all")')
+    parser.add_argument('--n-jobs', type=_n_jobs, help='Worker processes for per-SKU training (-1 = all cores, 1 = sequential)')
     
     args = parser.parse_args()
     
+    if args.n_jobs is not None:
+        set_training_jobs(args.n_jobs)
+    
     # Handle command line arguments
     if args.demo:
         print("=== Running Quick Demo ===")
@@ -175,6 +311,7 @@ if __name__ == "__main__":
     
     if args.generate:
         print("=== Generating Sample Data ===")
+        from sample_data_generator import SampleDataGenerator
         generator = SampleDataGenerator()
         generator.save_sample_data("model/sample_data")
         print("Sample data generated successfully!")
@@ -183,10 +320,10 @@ if __name__ == "__main__":
     if args.train:
         print("=== Training Model ===")
         if args.sales_file and args.inventory_file:
-            sales_df = pd.read_csv(args.sales_file)
-            inventory_df = pd.read_csv(args.inventory_file)
-            sales_df['date'] = pd.to_datetime(sales_df['date'])
+            sales_df = _read_sales(args.sales_file)
+            inventory_df = _read_inventory(args.inventory_file)
             
+            from trendwise_forecaster import TrendWiseForecaster
             forecaster = TrendWiseForecaster()
             training_result = forecaster.train_forecaster(sales_df)
             print(f"Training completed! Trained models for {len(training_result)} SKUs")
@@ -198,15 +335,17 @@ if __name__ == "__main__":
     if args.predict:
         print("=== Making Predictions ===")
         if args.sales_file and args.inventory_file:
-            sales_df = pd.read_csv(args.sales_file)
-            inventory_df = pd.read_csv(args.inventory_file)
-            sales_df['date'] = pd.to_datetime(sales_df['date'])
+            sales_df = _read_sales(args.sales_file)
+            inventory_df = _read_inventory(args.inventory_file)
             
+            from trendwise_forecaster import TrendWiseForecaster
             forecaster = TrendWiseForecaster()
-            predictions = forecaster.predict_demand(sales_df, inventory_df, args.lead_time)
-            print(f"Generated {len(predictions)} predictions:")
-            for pred in predictions:
-                print(f"{pred['sku']}: {pred['point_forecast']:.1f} units - {pred['recommendation']}")
+            # Print each batch as soon as it is scored; the count follows as a trailer
+            batch_size = get_param('performance', 'prediction')['batch_size']
+            count = _stream_predictions(
+                forecaster.iter_predictions(sales_df, inventory_df, args.lead_time, batch_size), batch_size
+            )
+            print(f"Generated {count} predictions")
         else:
             print("Error: Both --sales-file and --inventory-file are required for predictions")
             sys.exit(1)
@@ -216,18 +355,21 @@ if __name__ == "__main__":
     print("TrendWise Demand Forecaster - Sample Data Usage Guide")
     print("=" * 60)
     
-    # Choose which function to run
-    choice = input("\nChoose an option:\n1. Full demo (generate data + train)\n2. Quick test\n3. Load existing CSV files\nEnter choice (1-3): ")
-    
-    if choice == "1":
-        forecaster, predictions = generate_and_train()
-    elif choice == "2":
-        quick_test()
-    elif choice == "3":
-        forecaster, predictions = load_existing_csv_and_train()
+    # Choose which function to run; without a terminal (CI, pipes) there is
+    # nobody to answer the prompt, so fall straight through to the quick test
+    dispatch = {
+        "1": generate_and_train,
+        "2": quick_test,
+        "3": load_existing_csv_and_train,
+    }
+    if sys.stdin.isatty():
+        choice = input("\nChoose an option:\n1. Full demo (generate data + train)\n2. Quick test\n3. Load existing CSV files\nEnter choice (1-3): ")
+        if choice not in dispatch:
+            print("Invalid choice. Running quick test...")
     else:
-        print("Invalid choice. Running quick test...")
-        quick_test()
+        choice = "2"
+        print("\nNo interactive terminal detected. Running quick test...")
+    dispatch.get(choice, quick_test)()
     
     print("\n=== Usage Summary ===")
     print("1. Run this script to generate sample CSV files")